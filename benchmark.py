@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import isatara
+from isatara import PictureClusters, Record, RecordClient, RecordServer
+from PIL import Image
+
+
+def percentile(sorted_values, p):
+    if len(sorted_values) == 0:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def timing_summary(durations):
+    durations = sorted(durations)
+    mean = sum(durations) / max(1, len(durations))
+    return f"mean {mean*1e6 :8.1f}us  p50 {percentile(durations, 0.5)*1e6 :8.1f}us  p99 {percentile(durations, 0.99)*1e6 :8.1f}us"
+
+
+class SyntheticRater:
+
+    # judges pairs by hidden true scores per feature, with gaussian noise on every judgment
+    truth: dict
+    noise: float
+    tie_margin: float
+    unfit: float
+
+    def __init__(self, pic_ids, features, noise=0.5, tie_margin=0.05, unfit=0.02):
+        self.truth = dict([(feature, dict([(idx, random.gauss(0, 1)) for idx in pic_ids])) for feature in features])
+        self.noise = noise
+        self.tie_margin = tie_margin
+        self.unfit = unfit
+
+    def judge(self, idxL, idxR, feature):
+        if random.random() < self.unfit:
+            return "none"
+        difference = self.truth[feature][idxL] - self.truth[feature][idxR] + random.gauss(0, self.noise)
+        if abs(difference) < self.tie_margin:
+            return "both"
+        return "left" if difference > 0 else "right"
+
+
+def count_inversions(values):
+    # merge sort, counts pairs (i, j) with i < j and values[i] < values[j]
+    if len(values) < 2:
+        return (values, 0)
+    middle = len(values) // 2
+    left, inversions_left = count_inversions(values[:middle])
+    right, inversions_right = count_inversions(values[middle:])
+    merged = []
+    inversions = inversions_left + inversions_right
+    i = 0
+    j = 0
+    while i < len(left) and j < len(right):
+        if left[i] >= right[j]:
+            merged += [left[i]]
+            i += 1
+        else:
+            merged += [right[j]]
+            inversions += len(left) - i
+            j += 1
+    merged += left[i:] + right[j:]
+    return (merged, inversions)
+
+
+def kendall_tau(toplist, truth):
+    # agreement of a toplist, best first, with the true scores, 1 is the true order and -1 its reverse
+    values = [truth[tlentry[0]] for tlentry in toplist]
+    pairs = len(values) * (len(values) - 1) // 2
+    if pairs == 0:
+        return 0
+    _, discordant = count_inversions(values)
+    return 1 - 2 * discordant / pairs
+
+
+def sort_judgments(pics, features, rater, path, reload_every=0, skip=0.0):
+    # judgments the sort mode takes until every feature is sorted, reopening the record and skipping pairs on the way
+    record = Record(pics, path, "sort")
+    judged = 0
+    next_reload = reload_every
+    while True:
+        idxL, idxR, open_features = record.get_new_compair(features)
+        if idxL is None:
+            break
+        if random.random() < skip:
+            continue
+        for feature in open_features:
+            record.add_compair_result((idxL, idxR), feature, rater.judge(idxL, idxR, feature))
+            judged += 1
+        if reload_every > 0 and judged >= next_reload:
+            record.close()
+            record = Record(pics, path, "sort")
+            next_reload += reload_every
+    record.close()
+    return judged
+
+
+def bench_simulation(sizes, judgments, checkpoints, features, modes, scorers, noise, infer=0, drop_unfit=0):
+    # synthetic raters against every compair mode, ranking accuracy per scorer as the judgments add up
+    print(f"simulation ({judgments} judgments, features: {",".join(features)}, noise: {noise}, infer: {infer}, drop unfit: {drop_unfit})")
+    for size in sizes:
+        pics = [(i, f"{i}.png") for i in range(1, size + 1)]
+        for mode in modes:
+            rater = SyntheticRater([idx for idx, _ in pics], features, noise)
+            print(f"\t{size} images, {mode}:")
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, "bench.log")
+                record = Record(pics, path, mode, infer=infer, drop_unfit=drop_unfit)
+                get_durations = []
+                add_durations = []
+                judged = 0
+                marks = [judgments * (i + 1) // checkpoints for i in range(checkpoints)]
+                print(f"\t\t{"judgments" :>9}  " + "  ".join([f"{scorer :>12}" for scorer in scorers]))
+                while len(marks) > 0:
+                    start = time.perf_counter()
+                    idxL, idxR, open_features = record.get_new_compair(features)
+                    get_durations += [time.perf_counter() - start]
+                    if idxL is not None:
+                        for feature in open_features:
+                            result = rater.judge(idxL, idxR, feature)
+                            start = time.perf_counter()
+                            record.add_compair_result((idxL, idxR), feature, result)
+                            add_durations += [time.perf_counter() - start]
+                            judged += 1
+                    # a collection with every pair judged ends the run early
+                    if judged >= marks[0] or idxL is None:
+                        marks = [mark for mark in marks if mark > judged] if idxL is not None else []
+                        taus = [sum(kendall_tau(record.calculate_feature_toplist(feature, scorer=scorer), rater.truth[feature]) for feature in features) / len(features) for scorer in scorers]
+                        print(f"\t\t{judged :>9}  " + "  ".join([f"{tau :>12.3f}" for tau in taus]))
+                toplist_durations = []
+                for scorer in scorers:
+                    # a fresh scorer, so model fits start cold
+                    record.model_scorers = {}
+                    start = time.perf_counter()
+                    record.calculate_feature_toplist(features, scorer=scorer)
+                    toplist_durations += [time.perf_counter() - start]
+                print(f"\t\t{"toplist" :>9}  " + "  ".join([f"{duration*1e3 :>10.1f}ms" for duration in toplist_durations]))
+                print(f"\t\tget_new_compair     {timing_summary(get_durations)}")
+                print(f"\t\tadd_compair_result  {timing_summary(add_durations)}")
+                if mode == "sort":
+                    # a noiseless rater answers every pair the same way, so reloads and skips must not cost judgments
+                    exact = SyntheticRater([idx for idx, _ in pics], features, noise=0, unfit=0)
+                    counts = [sort_judgments(pics, features, exact, os.path.join(tmpdir, f"resume{i}.log"), reload_every, skip) for i, (reload_every, skip) in enumerate([(0, 0), (size, 0), (size // 4, 0.3)])]
+                    print(f"\t\tresume: {counts[0]} judgments in one session, {counts[1]} reloading every {size}, {counts[2]} reloading every {size // 4} and skipping 30%")
+                    orders = [record.sort_progress([feature])[0][3] for feature in features]
+                    if all(order is not None for order in orders):
+                        tau = sum(kendall_tau([(idx,) for idx in order], rater.truth[feature]) for order, feature in zip(orders, features)) / len(features)
+                        print(f"\t\tsorted after {judged} judgments ({sum(size * math.log2(size) for _ in features) :.0f} for n·log2(n)), merge order {tau :.3f}")
+                if record.preferences:
+                    inferred = sum(len(keys) for keys in record.pair_index.inferred.values())
+                    print(f"\t\t{inferred} compairs inferred, {len(record.contradictions())} contradictions")
+                record.close()
+                start = time.perf_counter()
+                Record(pics, path, mode).close()
+                load_duration = time.perf_counter() - start
+                # traced in a second pass, tracemalloc slows down everything it watches
+                tracemalloc.start()
+                loaded = Record(pics, path, mode)
+                for scorer in scorers:
+                    loaded.calculate_feature_toplist(features, scorer=scorer)
+                loaded.close()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"\t\tload {load_duration*1e3 :.1f}ms, peak memory {peak / 2**20 :.1f}MiB for load and toplists")
+
+
+def bench_get_new_compair(sizes, calls, features, prefill):
+    results = ["none", "both", "left", "right"]
+    print(f"get_new_compair latency ({calls} calls, features: {",".join(features)}, prefill: {prefill*100 :.0f}%)")
+    for size in sizes:
+        pics = [(i, f"{i}.png") for i in range(1, size + 1)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            record = Record(pics, os.path.join(tmpdir, "bench.log"), "random")
+            # judge a share of all pairs up front, to measure the late stage of a session
+            for _ in range(int(record.pair_index.pair_count() * prefill)):
+                idxL, idxR, open_features = record.get_new_compair(features)
+                if idxL is None:
+                    break
+                for feature in open_features:
+                    record.add_compair_result((idxL, idxR), feature, random.choice(results))
+            durations = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                idxL, idxR, open_features = record.get_new_compair(features)
+                durations += [time.perf_counter() - start]
+                if idxL is None:
+                    break
+                for feature in open_features:
+                    record.add_compair_result((idxL, idxR), feature, random.choice(results))
+            record.close()
+        durations.sort()
+        mean = sum(durations) / len(durations)
+        print(f"\t{size:>7} images: mean {mean*1e6 :8.1f}us  p50 {percentile(durations, 0.5)*1e6 :8.1f}us  p99 {percentile(durations, 0.99)*1e6 :8.1f}us  max {durations[-1]*1e6 :8.1f}us")
+
+
+def bench_dedupe(sizes, distance, cluster_size, pictures):
+    # near-duplicate grouping over synthetic hashes, families of hashes a few bits apart, then hashing of real files
+    print(f"near-duplicate clustering (distance: {distance}, mean cluster size: {cluster_size})")
+    for size in sizes:
+        hashes = {}
+        idx = 1
+        while idx <= size:
+            base = random.getrandbits(64)
+            for _ in range(random.randint(1, 2 * cluster_size - 1)):
+                value = base
+                for bit in random.sample(range(64), random.randint(0, distance // 2)):
+                    value ^= 1 << bit
+                hashes[idx] = value
+                idx += 1
+        clusters = PictureClusters(None, distance)
+        start = time.perf_counter()
+        clusters.group(hashes)
+        duration = time.perf_counter() - start
+        n = len(clusters.members)
+        print(f"\t{len(hashes) :>7} images: grouped in {duration*1e3 :.1f}ms into {n} clusters, pairs {len(hashes) * (len(hashes) - 1) // 2} -> {n * (n - 1) // 2}")
+        # pictures found by a rescan, near existing ones but possibly out of reach of their representative
+        added = {}
+        for other in random.sample(sorted(hashes), min(len(hashes), 100)):
+            value = hashes[other]
+            for bit in random.sample(range(64), distance):
+                value ^= 1 << bit
+            added[idx] = value
+            idx += 1
+        start = time.perf_counter()
+        clusters.group(added)
+        duration = time.perf_counter() - start
+        consistent = all(clusters.members[representative][0] == representative and member in clusters.members[representative] for member, representative in clusters.representative.items())
+        consistent &= sum(len(members) for members in clusters.members.values()) == len(clusters.representative)
+        print(f"\t\trescan: {len(added)} pictures grouped in {duration*1e3 :.1f}ms into {len(clusters.members) - n} new clusters, consistent: {consistent}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for idx in range(1, pictures + 1):
+            Image.effect_noise((64, 48), 60).convert("RGB").resize((1600, 1200)).save(os.path.join(tmpdir, f"{idx}.jpg"), quality=85)
+        pics = [(idx, f"{idx}.jpg") for idx in range(1, pictures + 1)]
+        path = os.path.join(tmpdir, ".isatara-hashes")
+        for state in ["cold", "cached"]:
+            start = time.perf_counter()
+            PictureClusters(tmpdir, distance, path).add(pics)
+            print(f"\thashing {pictures} pictures of 1600x1200, {state}: {(time.perf_counter() - start)*1e3 :.1f}ms")
+
+
+def bench_server(size, clients, judgments, features, lease_timeout, abandon):
+    # simulated raters against a record server on localhost, some of them walk away from their pairs
+    results = ["none", "both", "left", "right"]
+    print(f"record server ({clients} clients, {judgments} judgments each, {size} images, abandon: {abandon*100 :.0f}%)")
+    pics = [(i, f"{i}.png") for i in range(1, size + 1)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        record = Record(pics, os.path.join(tmpdir, "bench.log"), "random")
+        server = RecordServer(record, lease_timeout)
+        ready = threading.Event()
+        server_thread = threading.Thread(target=asyncio.run, args=(server.serve("127.0.0.1", 0, ready),))
+        server_thread.start()
+        ready.wait()
+        rejected = [0] * clients
+        late = [[0, 0] for _ in range(clients)]
+
+        def rate(n):
+            client = RecordClient("127.0.0.1", server.port)
+            done = 0
+            # abandoned pairs whose result still arrives, after the lease expired and maybe went to another rater
+            overdue = []
+            while done < judgments:
+                now = time.monotonic()
+                for lease_id, cpair, open_features in [entry[1:] for entry in overdue if entry[0] <= now]:
+                    for feature in open_features:
+                        ok = client.request(op="result", lease=lease_id, pair=list(cpair), feature=feature, result=random.choice(results))["ok"]
+                        late[n][0 if ok else 1] += 1
+                overdue = [entry for entry in overdue if entry[0] > now]
+                idxL, idxR, open_features = client.get_new_compair(features)
+                if idxL is None and client.done:
+                    break
+                if idxL is None:
+                    time.sleep(lease_timeout / 10)
+                    continue
+                client.peek_compairs(features, 2)
+                if random.random() < abandon:
+                    # leave the lease to expire, as a rater closing the window would, half of them answer late
+                    if random.random() < 0.5:
+                        overdue += [(time.monotonic() + lease_timeout * random.uniform(1, 3), client.current, (idxL, idxR), open_features)]
+                    client.current = None
+                    continue
+                for feature in open_features:
+                    if not client.add_compair_result((idxL, idxR), feature, random.choice(results)):
+                        rejected[n] += 1
+                    done += 1
+            client.close()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=rate, args=(n,)) for n in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+        server.stop()
+        server_thread.join()
+        judged = [(entry.feature, *sorted((entry.idxL, entry.idxR))) for entry in record.entries]
+        print(f"\t{len(judged)} judgments in {duration :.2f}s ({len(judged) / duration :.0f}/s), {sum(rejected)} rejected results, late results {sum(accepted for accepted, _ in late)} accepted and {sum(refused for _, refused in late)} rejected, {len(judged) - len(set(judged))} duplicate judgments")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", required=False, default="latency,simulation", metavar="SUITES", help="comma-separated list of benchmarks to run: latency, simulation, server, dedupe")
+    parser.add_argument("--sizes", required=False, default="1000,10000,50000", metavar="SIZES", help="comma-separated list of collection sizes for the latency, server and dedupe benchmarks")
+    parser.add_argument("--calls", required=False, type=int, default=2000, metavar="CALLS", help="number of timed calls per size")
+    parser.add_argument("--features", required=False, default="*", metavar="FEATURES", help="comma-separated list of comparison features")
+    parser.add_argument("--prefill", required=False, type=float, default=0.0, metavar="SHARE", help="share of all pairs to judge before timing")
+    parser.add_argument("--seed", required=False, type=int, default=0, metavar="SEED", help="random seed")
+    parser.add_argument("--sim-sizes", required=False, default="200,1000", metavar="SIZES", help="comma-separated list of collection sizes for the simulation")
+    parser.add_argument("--modes", required=False, default="random,refine,explore,smart", metavar="MODES", help="comma-separated list of compair modes to simulate")
+    parser.add_argument("--scorers", required=False, default="winratio,bradleyterry,elo,pagerank", metavar="SCORERS", help="comma-separated list of scorers to evaluate in the simulation")
+    parser.add_argument("--checkpoints", required=False, type=int, default=4, metavar="COUNT", help="number of ranking evaluations during a simulation")
+    parser.add_argument("--noise", required=False, type=float, default=0.5, metavar="SIGMA", help="judgment noise of the synthetic raters, true scores have a deviation of 1")
+    parser.add_argument("--infer", required=False, type=float, default=0, metavar="CONFIDENCE", help="confidence for skipping implied compairs in the simulation, 0 disables")
+    parser.add_argument("--drop-unfit", required=False, type=int, default=0, metavar="COUNT", help="unfit marks after which a picture leaves the pool in the simulation, 0 disables")
+    parser.add_argument("--clients", required=False, type=int, default=8, metavar="CLIENTS", help="number of simulated raters against a local record server")
+    parser.add_argument("--judgments", required=False, type=int, default=2000, metavar="JUDGMENTS", help="number of judgments per simulated rater")
+    parser.add_argument("--lease-timeout", required=False, type=float, default=0.05, metavar="SECONDS", help="lease timeout of the record server")
+    parser.add_argument("--abandon", required=False, type=float, default=0.05, metavar="SHARE", help="share of leased pairs the simulated raters walk away from")
+    parser.add_argument("--dedupe", required=False, type=int, default=10, metavar="DISTANCE", help="hash distance for grouping near-duplicates")
+    parser.add_argument("--cluster-size", required=False, type=int, default=4, metavar="COUNT", help="mean cluster size of the synthetic hashes")
+    parser.add_argument("--hash-pictures", required=False, type=int, default=200, metavar="COUNT", help="number of generated pictures to hash")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    suites = args.suites.split(",")
+    sizes = [int(size) for size in args.sizes.split(",")]
+    scorers = args.scorers.split(",")
+    if isatara.np is None and scorers != ["winratio"]:
+        print("WARN: numpy is not available, only the winratio scorer is evaluated")
+        scorers = ["winratio"]
+    if "latency" in suites:
+        bench_get_new_compair(sizes, args.calls, args.features.split(","), args.prefill)
+    if "simulation" in suites:
+        bench_simulation([int(size) for size in args.sim_sizes.split(",")], args.judgments, args.checkpoints, args.features.split(","), args.modes.split(","), scorers, args.noise, args.infer, args.drop_unfit)
+    if "server" in suites:
+        bench_server(sizes[0], args.clients, args.judgments, args.features.split(","), args.lease_timeout, args.abandon)
+    if "dedupe" in suites:
+        bench_dedupe(sizes, args.dedupe, args.cluster_size, args.hash_pictures)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,1350 @@
 #!/usr/bin/env python3
 
 import argparse
-import tkinter as tk
-from tkinter import PhotoImage
-from PIL import Image, ImageDraw, ImageFont, ImageTk
+import asyncio
+import atexit
+import bisect
+import functools
+import heapq
+from PIL import Image, ImageDraw, ImageFont
+import csv
+import json
 import os
 import re
-from collections import Counter
+import signal
+import socket
+import sys
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+import time
+import hashlib
+import mmap
+import struct
+import math
 import random
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
+def import_gui():
+    # tkinter is only imported for the interactive app, so the headless subcommands run without a display
+    global tk, ImageTk
+    import tkinter as tk
+    from PIL import ImageTk
+
+
+class Profiler:
+
+    # timing spans around the hot paths, a rolling window of durations per stage gives the percentiles
+    # while disabled span() hands out one shared no-op context, so instrumented code only pays a call
+    enabled: bool
+    window: int
+    durations: dict
+    counts: dict
+    tracing: bool
+    spans: list
+    max_spans: int
+    dropped: int
+    origin: int
+    lock: threading.Lock
+
+    class Span:
+        __slots__ = ("profiler", "stage", "start")
+        profiler: "Profiler"
+        stage: str
+        start: int
+        def __init__(self, profiler, stage):
+            self.profiler = profiler
+            self.stage = stage
+        def __enter__(self):
+            self.start = time.perf_counter_ns()
+            return self
+        def __exit__(self, *exc_info):
+            self.profiler.add(self.stage, self.start, time.perf_counter_ns())
+            return False
+
+    class NoSpan:
+        __slots__ = ()
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc_info):
+            return False
+
+    no_span = NoSpan()
+
+    def __init__(self, window=1000, max_spans=1000000):
+        self.enabled = False
+        self.window = window
+        self.durations = {}
+        self.counts = {}
+        # single spans are only kept for an export
+        self.tracing = False
+        self.spans = []
+        self.max_spans = max_spans
+        self.dropped = 0
+        self.origin = time.perf_counter_ns()
+        # spans also end on the prefetcher threads
+        self.lock = threading.Lock()
+
+    def start(self, tracing=False):
+        self.enabled = True
+        self.tracing = self.tracing or tracing
+
+    def stop(self):
+        self.enabled = False
+
+    def span(self, stage):
+        if not self.enabled:
+            return self.no_span
+        return self.Span(self, stage)
+
+    def add(self, stage, start, end):
+        with self.lock:
+            if stage not in self.durations:
+                self.durations[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+            self.durations[stage].append(end - start)
+            self.counts[stage] += 1
+            if self.tracing:
+                if len(self.spans) < self.max_spans:
+                    self.spans.append((stage, start, end - start, threading.get_ident()))
+                else:
+                    self.dropped += 1
+
+    def summary(self):
+        # per stage the total count, and percentiles over the window in seconds
+        with self.lock:
+            windows = dict([(stage, sorted(durations)) for stage, durations in self.durations.items()])
+            counts = dict(self.counts)
+        summary = {}
+        for stage, durations in windows.items():
+            summary[stage] = {"count": counts[stage]}
+            for name, p in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]:
+                summary[stage][name] = durations[min(len(durations) - 1, int(len(durations) * p))] / 1e9
+            summary[stage]["max"] = durations[-1] / 1e9
+        return summary
+
+    def export(self, path, trace_format="chrome"):
+        with self.lock:
+            spans = list(self.spans)
+        if trace_format == "chrome":
+            # trace event format, loads in chrome://tracing and perfetto
+            trace = {
+                "traceEvents": [{"name": stage, "cat": "isatara", "ph": "X", "ts": (start - self.origin) / 1000, "dur": duration / 1000, "pid": os.getpid(), "tid": thread} for stage, start, duration, thread in spans],
+                "displayTimeUnit": "ms",
+            }
+        else:
+            trace = {
+                "stages": self.summary(),
+                "spans": [{"stage": stage, "start": (start - self.origin) / 1e9, "duration": duration / 1e9, "thread": thread} for stage, start, duration, thread in spans],
+                "dropped": self.dropped,
+            }
+        with open(path, "w") as file:
+            json.dump(trace, file)
+
+
+# shared by the app and the loaders on its worker threads, disabled unless asked for
+profiler = Profiler()
+
+
+@functools.lru_cache(maxsize=256)
 def PILmeasureText(text_string, font):
     # https://stackoverflow.com/a/46220683/9263761
+    # memoised, fonts come from PILloadFont and are the same objects for the same size
     ascent, descent = font.getmetrics()
-    text_width = font.getmask(text_string).getbbox()[2]
-    text_height = font.getmask(text_string).getbbox()[3] + descent
+    bbox = font.getmask(text_string).getbbox()
+    text_width = bbox[2]
+    text_height = bbox[3] + descent
     return (text_width, text_height)
 
 
+@functools.lru_cache(maxsize=64)
+def PILloadFont(size):
+    return ImageFont.load_default(size)
+
+
+def render_feature_strip(featureStr, width, height, decided, last):
+    featureImg = Image.new("RGBA", (width, height + (1 if last else 0)), (0, 0, 0, 50) if not decided else (0, 0, 0, 0))
+    featureDraw = ImageDraw.Draw(featureImg)
+    featureFontSize = height * 0.8
+    featureFont = PILloadFont(featureFontSize)
+    #TODO looks very good with all caps feature names, but we could also measure the str and center it manually (unreasonable effort though)
+    text_width, text_height = PILmeasureText(featureStr, featureFont)
+    horizontal_fill_ratio = 0.9
+    if text_width > width * horizontal_fill_ratio:
+        featureFontSize = featureFontSize * ((width * horizontal_fill_ratio) / text_width)
+        featureFont = PILloadFont(featureFontSize)
+    featureDraw.text((width/2, height/2), featureStr, anchor="mm", fill=(255, 255, 255, 50), stroke_width=3, stroke_fill=(0, 0, 0, 100) if not decided else (0, 0, 0, 50), font=featureFont)
+    return featureImg
+
+
+class PairIndex:
+
+    # judged compairs per feature, keyed by a triangular index over picture slots
+    # only judged combinations are stored, open ones are implied by their absence
+    # inferred compairs are closed without a judgment, their result follows from others
+    slots: dict
+    slot_ids: list
+    judged: dict
+    inferred: dict
+    samplers: dict
+
+    def __init__(self, pic_ids):
+        self.slots = {}
+        self.slot_ids = []
+        self.judged = {}
+        self.inferred = {}
+        self.samplers = {}
+        self.add_pics(pic_ids)
+
+    def add_pic(self, pic_id):
+        self.add_pics([pic_id])
+
+    def add_pics(self, pic_ids):
+        # new pictures always get the next slot, so existing pair keys stay valid
+        added = False
+        for pic_id in pic_ids:
+            if pic_id not in self.slots:
+                self.slots[pic_id] = len(self.slot_ids)
+                self.slot_ids += [pic_id]
+                added = True
+        # samplers are rebuilt once for the whole batch
+        if added:
+            for sampler in self.samplers.values():
+                sampler.rebuild()
+
+    def lookup_slots(self, ids):
+        # vectorised slots lookup, returns the slots and which ids are known at all
+        known = np.array(self.slot_ids, dtype=np.int64)
+        order = np.argsort(known)
+        ids = ids.astype(np.int64)
+        if len(known) == 0:
+            return (np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool))
+        position = np.minimum(np.searchsorted(known[order], ids), len(known) - 1)
+        return (order[position], known[order][position] == ids)
+
+    def pair_count(self):
+        n = len(self.slot_ids)
+        return n * (n - 1) // 2
+
+    def pair_key(self, id1, id2):
+        i = self.slots.get(id1)
+        j = self.slots.get(id2)
+        if i is None or j is None or i == j:
+            return None
+        if i > j:
+            i, j = j, i
+        return j * (j - 1) // 2 + i
+
+    @staticmethod
+    def key_row(key):
+        return (1 + math.isqrt(1 + 8 * key)) // 2
+
+    def key_pair(self, key):
+        j = self.key_row(key)
+        i = key - j * (j - 1) // 2
+        return tuple(sorted((self.slot_ids[i], self.slot_ids[j])))
+
+    def add(self, id1, id2, feature):
+        key = self.pair_key(id1, id2)
+        if key is None:
+            return False
+        if key in self.judged.get(feature, ()):
+            return False
+        self.close(key, feature, self.judged)
+        return True
+
+    def infer(self, id1, id2, feature):
+        key = self.pair_key(id1, id2)
+        if key is None or self.key_is_closed(key, feature):
+            return False
+        self.close(key, feature, self.inferred)
+        return True
+
+    def close(self, key, feature, closed_sets):
+        was_open = [features for features in self.samplers if feature in features and self.key_is_open(key, features)]
+        if feature not in closed_sets:
+            closed_sets[feature] = set()
+        closed_sets[feature].add(key)
+        for features in was_open:
+            if not self.key_is_open(key, features):
+                self.samplers[features].close_key(key)
+
+    def key_is_closed(self, key, feature):
+        return key in self.judged.get(feature, ()) or key in self.inferred.get(feature, ())
+
+    def is_open(self, id1, id2, feature):
+        key = self.pair_key(id1, id2)
+        return key is not None and not self.key_is_closed(key, feature)
+
+    def is_judged(self, id1, id2, feature):
+        key = self.pair_key(id1, id2)
+        return key is not None and key in self.judged.get(feature, ())
+
+    def key_is_open(self, key, features):
+        return any(not self.key_is_closed(key, feature) for feature in features)
+
+    def open_features(self, id1, id2, features):
+        # keeps the order of the given features
+        key = self.pair_key(id1, id2)
+        return [feature for feature in features if not self.key_is_closed(key, feature)]
+
+    def closed_keys(self, features):
+        # keys judged or inferred for every one of the features
+        closed_sets = sorted([self.judged.get(feature, set()) | self.inferred.get(feature, set()) for feature in features], key=len)
+        if len(closed_sets) == 0:
+            return set()
+        closed = closed_sets[0]
+        for closed_set in closed_sets[1:]:
+            closed = closed.intersection(closed_set)
+        return closed
+
+    def sampler(self, features):
+        features = tuple(sorted(set(features)))
+        if features not in self.samplers:
+            self.samplers[features] = PairSampler(self, features)
+        return self.samplers[features]
+
+    def open_count(self, features):
+        # a pair is open while at least one of the features is not judged for it
+        return self.sampler(features).open_count
+
+    def sample_open(self, features):
+        return self.sampler(features).sample()
+
+
+class PairSampler:
+
+    # uniform sampling of open pairs for a fixed feature set
+    # row j holds the pairs (i, j) with i < j, rows are weighted by their open pair count in a fenwick tree
+    pair_index: PairIndex
+    features: tuple
+    row_open: list
+    tree: list
+    open_count: int
+
+    def __init__(self, pair_index, features):
+        self.pair_index = pair_index
+        self.features = features
+        self.rebuild()
+
+    def rebuild(self):
+        n = len(self.pair_index.slot_ids)
+        self.row_open = list(range(n))
+        for key in self.pair_index.closed_keys(self.features):
+            self.row_open[self.pair_index.key_row(key)] -= 1
+        # linear time fenwick construction, tree is 1-based
+        self.tree = [0] + self.row_open
+        for pos in range(1, n + 1):
+            parent = pos + (pos & -pos)
+            if parent <= n:
+                self.tree[parent] += self.tree[pos]
+        self.open_count = sum(self.row_open)
+
+    def close_key(self, key):
+        row = self.pair_index.key_row(key)
+        self.row_open[row] -= 1
+        self.open_count -= 1
+        pos = row + 1
+        while pos < len(self.tree):
+            self.tree[pos] -= 1
+            pos += pos & -pos
+
+    def find_row(self, rank):
+        # smallest row whose prefix sum of open pairs exceeds rank
+        pos = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            if pos + step < len(self.tree) and self.tree[pos + step] <= rank:
+                pos += step
+                rank -= self.tree[pos]
+            step >>= 1
+        return pos
+
+    def sample(self):
+        if self.open_count == 0:
+            return None
+        row = self.find_row(random.randrange(self.open_count))
+        base = row * (row - 1) // 2
+        # rejection sampling within the row while it is still reasonably open, scan it otherwise
+        if self.row_open[row] * 4 >= row:
+            while True:
+                key = base + random.randrange(row)
+                if self.pair_index.key_is_open(key, self.features):
+                    return self.pair_index.key_pair(key)
+        open_keys = [key for key in range(base, base + row) if self.pair_index.key_is_open(key, self.features)]
+        return self.pair_index.key_pair(random.choice(open_keys))
+
+
+class PairScheduler:
+
+    # active pair selection for the refine, explore and smart compair modes
+    # estimates are read from the record statistics, which every added result updates in O(1),
+    # and candidates come from small random samples, so a pick never scans the whole collection
+    record: "Record"
+    mode: str
+    candidates: int
+    picks: int
+
+    def __init__(self, record, mode, candidates=16):
+        self.record = record
+        self.mode = mode
+        self.candidates = candidates
+        self.picks = 0
+
+    def estimate(self, feature, idx):
+        # beta posterior of the win share, starting from a uniform prior
+        wins = 0
+        totals = 0
+        if feature in self.record.statistics and idx in self.record.statistics[feature]:
+            sentry = self.record.statistics[feature][idx]
+            wins = sentry.pref_win + sentry.share_win
+            totals = wins + sentry.pref_loss + sentry.unfit_loss
+        mean = (wins + 1) / (totals + 2)
+        variance = mean * (1 - mean) / (totals + 3)
+        return (mean, variance)
+
+    def anchor_score(self, idx, features, favored):
+        estimates = [self.estimate(feature, idx) for feature in features]
+        if favored:
+            return sum(mean for mean, _ in estimates)
+        return sum(variance for _, variance in estimates)
+
+    def pair_gain(self, idxA, idxB, features):
+        gain = 0
+        for feature in features:
+            meanA, varianceA = self.estimate(feature, idxA)
+            meanB, varianceB = self.estimate(feature, idxB)
+            # chance that the current estimates order the pair wrongly, highest for close and uncertain pairs
+            closeness = math.exp(-((meanA - meanB) ** 2) / (2 * (varianceA + varianceB)))
+            if self.mode == "refine":
+                gain += closeness * (meanA + meanB)
+            elif self.mode == "explore":
+                gain += varianceA + varianceB
+            else:
+                gain += closeness * (varianceA + varianceB)
+        return gain
+
+    def pick(self, features):
+        pic_ids = self.record.pic_ids
+        if len(pic_ids) < 2:
+            return None
+        self.picks += 1
+        if self.mode == "refine":
+            favored = True
+        elif self.mode == "explore":
+            favored = False
+        else:
+            # smart alternates between anchoring on a favored and on an uncertain picture
+            favored = self.picks % 2 == 0
+        sample = random.sample(pic_ids, min(self.candidates, len(pic_ids)))
+        anchor = max(sample, key=lambda idx: self.anchor_score(idx, features, favored))
+        partners = random.sample(pic_ids, min(self.candidates, len(pic_ids)))
+        if self.mode != "explore":
+            # neighbours of the anchor in the live toplist are the closest calls
+            ranking = self.record.ranking(features)
+            position = bisect.bisect_left(ranking.by_favor, (-ranking.scores[anchor][0], -anchor))
+            half = self.candidates // 2
+            partners += [-key[1] for key in ranking.by_favor[max(0, position - half):position + half + 1]]
+        best = None
+        best_gain = -1
+        for idx in partners:
+            if idx == anchor:
+                continue
+            open_features = self.record.pair_index.open_features(anchor, idx, features)
+            if len(open_features) == 0:
+                continue
+            gain = self.pair_gain(anchor, idx, open_features)
+            if gain > best_gain:
+                best = idx
+                best_gain = gain
+        if best is None:
+            # anchor is (nearly) done, any open pair still beats offering nothing
+            return self.record.pair_index.sample_open(features)
+        return tuple(sorted((anchor, best)))
+
+
+class MergeSort:
+
+    # a resumable merge sort of all pictures for one feature
+    # merges are generators which stop at every comparison the log cannot answer yet, and which runs get merged
+    # is fixed by position, so rerunning the sort over the same log lands exactly where it left off
+    scheduler: "SortScheduler"
+    feature: str
+    levels: list
+    started: set
+    waiting: dict
+    ready: list
+
+    def __init__(self, scheduler, feature, pic_ids):
+        self.scheduler = scheduler
+        self.feature = feature
+        # bottom-up merge tree, level 0 holds single pictures, run i of a level merges runs 2i and 2i+1 below
+        # and an odd last run moves up unchanged; runs are None until finished
+        self.levels = [[[idx] for idx in pic_ids]]
+        while len(self.levels[-1]) > 1:
+            self.levels += [[None] * ((len(self.levels[-1]) + 1) // 2)]
+        self.started = set()
+        # cpair -> (merge, level, position) blocked on it, in the order they are offered
+        self.waiting = {}
+        # merges whose comparison was answered since
+        self.ready = []
+        # independent merges run side by side, so there is always more than one pair to offer
+        for position in range(len(self.levels[0])):
+            self.finished(0, position)
+
+    def merge(self, left, right):
+        merged = []
+        i = 0
+        j = 0
+        while i < len(left) and j < len(right):
+            left_first = self.scheduler.compare(self.feature, left[i], right[j])
+            while left_first is None:
+                yield tuple(sorted((left[i], right[j])))
+                left_first = self.scheduler.compare(self.feature, left[i], right[j])
+            if left_first:
+                merged += [left[i]]
+                i += 1
+            else:
+                merged += [right[j]]
+                j += 1
+        return merged + left[i:] + right[j:]
+
+    def finished(self, level, position):
+        # starts the merge above a finished run, once its sibling is finished too
+        if level + 1 == len(self.levels) or (level + 1, position // 2) in self.started:
+            return
+        runs = self.levels[level]
+        first = position - position % 2
+        if first + 1 == len(runs):
+            self.started.add((level + 1, position // 2))
+            self.levels[level + 1][position // 2] = runs[first]
+            self.finished(level + 1, position // 2)
+        elif runs[first] is not None and runs[first + 1] is not None:
+            self.started.add((level + 1, position // 2))
+            self.advance((self.merge(runs[first], runs[first + 1]), level + 1, position // 2))
+
+    def advance(self, task):
+        merge, level, position = task
+        try:
+            self.waiting[next(merge)] = task
+        except StopIteration as done:
+            self.levels[level][position] = done.value
+            self.finished(level, position)
+
+    def answered(self, cpair):
+        if cpair in self.waiting:
+            self.ready += [self.waiting.pop(cpair)]
+
+    def settle(self):
+        while len(self.ready) > 0:
+            self.advance(self.ready.pop())
+
+    def pending(self, exclude):
+        # oldest waiting comparison first, an offered one goes to the back, so a skipped pair does not block the rest
+        while True:
+            cpair = next((cpair for cpair in self.waiting if cpair not in exclude), None)
+            if cpair is None:
+                return None
+            if self.scheduler.compare(self.feature, *cpair) is not None:
+                # answered by inference meanwhile, without a judgment of its own
+                self.answered(cpair)
+                self.settle()
+                continue
+            self.waiting[cpair] = self.waiting.pop(cpair)
+            return cpair
+
+    def merges_left(self):
+        return sum(run is None for level in self.levels for run in level)
+
+    def done(self):
+        return len(self.levels[-1]) == 0 or self.levels[-1][0] is not None
+
+    def order(self):
+        # best first, once done
+        if not self.done():
+            return None
+        return self.levels[-1][0] if len(self.levels[-1]) > 0 else []
+
+
+class SortScheduler:
+
+    # compair selection for the sort mode, one merge sort per feature, about n log2 n judgments each
+    # the comparisons are answered from the log by majority vote, ties keep the order of the runs
+    record: "Record"
+    votes: dict
+    consumed: int
+    sorts: dict
+
+    def __init__(self, record):
+        self.record = record
+        # feature -> (low id, high id) -> [wins of low, wins of high]
+        self.votes = {}
+        self.consumed = 0
+        self.sorts = {}
+
+    def reset(self):
+        # the pictures changed, the sorts are redone over the log, which still answers all known comparisons
+        self.sorts = {}
+
+    def sync(self):
+        entries = self.record.entries
+        for i in range(self.consumed, len(entries)):
+            feature = entries.features[entries.feature[i]]
+            idxL = entries.idxL[i]
+            idxR = entries.idxR[i]
+            cpair = (min(idxL, idxR), max(idxL, idxR))
+            if feature not in self.votes:
+                self.votes[feature] = {}
+            if cpair not in self.votes[feature]:
+                self.votes[feature][cpair] = [0, 0]
+            # result codes in order > < = x, ties and unfit marks only count as answered
+            result = entries.result[i]
+            if result in [0, 1]:
+                winner = idxL if result == 0 else idxR
+                self.votes[feature][cpair][0 if winner == cpair[0] else 1] += 1
+            if feature in self.sorts:
+                self.sorts[feature].answered(cpair)
+        self.consumed = len(entries)
+
+    def compare(self, feature, idxA, idxB):
+        # whether idxA goes first, None while unknown
+        cpair = (min(idxA, idxB), max(idxA, idxB))
+        votes = self.votes.get(feature, {}).get(cpair)
+        if votes is not None:
+            wins = votes[0] if idxA == cpair[0] else votes[1]
+            losses = votes[1] if idxA == cpair[0] else votes[0]
+            return wins >= losses
+        preferences = self.record.preferences
+        if preferences:
+            # pictures out of the pool go last, implied results need no judgment
+            if preferences.dropped(feature, idxA) or preferences.dropped(feature, idxB):
+                return not preferences.dropped(feature, idxA)
+            if preferences.threshold > 0:
+                preferences.sync()
+                if preferences.search(feature, idxA, idxB, preferences.threshold) is not None:
+                    return True
+                if preferences.search(feature, idxB, idxA, preferences.threshold) is not None:
+                    return False
+        return None
+
+    def sort(self, feature):
+        self.sync()
+        if feature not in self.sorts:
+            self.sorts[feature] = MergeSort(self, feature, self.record.pic_ids)
+        self.sorts[feature].settle()
+        return self.sorts[feature]
+
+    def pick(self, features):
+        exclude = set(self.record.upcoming)
+        for feature in features:
+            cpair = self.sort(feature).pending(exclude)
+            if cpair is not None:
+                return cpair
+        return None
+
+    def waits_on(self, cpair, feature):
+        return feature in self.sorts and tuple(sorted(cpair)) in self.sorts[feature].waiting
+
+    def progress(self, feature):
+        # (merges left, merges waiting for a judgment)
+        merge_sort = self.sort(feature)
+        return (merge_sort.merges_left(), len(merge_sort.waiting))
+
+
+class PreferenceGraph:
+
+    # preferences that follow from the judged compairs, per feature
+    # an edge points from winner to loser once a pair was won more often one way than the other,
+    # its confidence is the smoothed share of those wins, and a chain of edges is as confident as their product
+    record: "Record"
+    threshold: float
+    drop_unfit: int
+    budget: int
+    wins: dict
+    edges_out: dict
+    consumed: int
+    contradictions: list
+    recheck: list
+    rechecked: set
+
+    def __init__(self, record, threshold, drop_unfit=0, budget=256):
+        self.record = record
+        self.threshold = threshold
+        self.drop_unfit = drop_unfit
+        # nodes a single search may expand, which bounds the cost of every check
+        self.budget = budget
+        # feature -> winner -> loser -> count
+        self.wins = {}
+        # feature -> winner -> loser -> confidence, only the edges currently pointing that way
+        self.edges_out = {}
+        self.consumed = 0
+        # (feature, [idx, ..]), a cycle of preferences closing back on its first picture
+        self.contradictions = []
+        # (cpair, feature) to be judged once more
+        self.recheck = []
+        self.rechecked = set()
+
+    def sync(self):
+        entries = self.record.entries
+        start = self.consumed
+        if start == len(entries):
+            return
+        for i in range(start, len(entries)):
+            # result codes in order > < = x, ties and unfit marks say nothing about the order
+            result = entries.result[i]
+            if result == 0:
+                self.add_win(entries.features[entries.feature[i]], entries.idxL[i], entries.idxR[i])
+            elif result == 1:
+                self.add_win(entries.features[entries.feature[i]], entries.idxR[i], entries.idxL[i])
+        self.consumed = len(entries)
+        if len(entries) - start == 1:
+            if entries.result[start] in [0, 1]:
+                winner, loser = (entries.idxL[start], entries.idxR[start]) if entries.result[start] == 0 else (entries.idxR[start], entries.idxL[start])
+                self.check_contradiction(entries.features[entries.feature[start]], winner, loser)
+        else:
+            # a whole log at once, cycles are found in one pass over the strongly connected components
+            self.contradictions = []
+            for feature in self.wins:
+                self.find_cycles(feature)
+            if len(self.contradictions) > 0:
+                print(f"WARN: {len(self.contradictions)} cycles of contradicting preferences in the record")
+
+    def add_win(self, feature, winner, loser):
+        if feature not in self.wins:
+            self.wins[feature] = {}
+            self.edges_out[feature] = {}
+        wins = self.wins[feature]
+        if winner not in wins:
+            wins[winner] = {}
+        wins[winner][loser] = wins[winner].get(loser, 0) + 1
+        # only the edge between these two can change
+        count = wins[winner][loser]
+        back = wins.get(loser, {}).get(winner, 0)
+        edges_out = self.edges_out[feature]
+        for source, target, direction in [(winner, loser, count - back), (loser, winner, back - count)]:
+            if direction > 0:
+                if source not in edges_out:
+                    edges_out[source] = {}
+                edges_out[source][target] = (max(count, back) + 1) / (count + back + 2)
+            elif source in edges_out:
+                edges_out[source].pop(target, None)
+
+    def edges(self, feature, idx):
+        return self.edges_out.get(feature, {}).get(idx, {}).items()
+
+    def search(self, feature, source, target, threshold):
+        # most confident chain of preferences from source to target first, gives up after the budget
+        best = {source: 1.0}
+        parent = {}
+        heap = [(-1.0, source)]
+        expanded = 0
+        while len(heap) > 0 and expanded < self.budget:
+            confidence, idx = heapq.heappop(heap)
+            confidence = -confidence
+            if confidence < best[idx]:
+                continue
+            if idx == target:
+                path = [idx]
+                while path[-1] != source:
+                    path += [parent[path[-1]]]
+                return path[::-1]
+            expanded += 1
+            for loser, edge_confidence in self.edges(feature, idx):
+                chain_confidence = confidence * edge_confidence
+                if chain_confidence >= threshold and chain_confidence > best.get(loser, 0):
+                    best[loser] = chain_confidence
+                    parent[loser] = idx
+                    heapq.heappush(heap, (-chain_confidence, loser))
+        return None
+
+    def implied(self, feature, idxA, idxB):
+        self.sync()
+        return self.search(feature, idxA, idxB, self.threshold) is not None or self.search(feature, idxB, idxA, self.threshold) is not None
+
+    def dropped(self, feature, idx):
+        # pictures only ever marked unfit leave the pool after a number of those marks
+        statistics = self.record.statistics.get(feature)
+        if self.drop_unfit <= 0 or statistics is None or idx not in statistics:
+            return False
+        sentry = statistics[idx]
+        return sentry.unfit_loss >= self.drop_unfit and sentry.pref_win + sentry.share_win == 0
+
+    def prune(self, feature, idxL, idxR):
+        if self.dropped(feature, idxL) or self.dropped(feature, idxR):
+            return True
+        return self.threshold > 0 and self.implied(feature, idxL, idxR)
+
+    def check_contradiction(self, feature, winner, loser):
+        # a new preference against a confident chain the other way closes a cycle
+        if loser not in self.edges_out[feature].get(winner, {}):
+            return
+        path = self.search(feature, loser, winner, self.threshold)
+        if path is None:
+            return
+        self.add_contradiction(feature, [winner] + path)
+
+    def add_contradiction(self, feature, cycle):
+        self.contradictions += [(feature, cycle)]
+        print(f"WARN: contradicting preferences in {feature}: {" > ".join([str(idx) for idx in cycle])}")
+        # the least confident step is the likeliest mistake, worth a second look
+        steps = [(self.edges_out[feature][cycle[i]][cycle[i + 1]], tuple(sorted((cycle[i], cycle[i + 1])))) for i in range(len(cycle) - 1)]
+        _, cpair = min(steps)
+        if (cpair, feature) not in self.rechecked:
+            self.rechecked.add((cpair, feature))
+            self.recheck += [(cpair, feature)]
+
+    def find_cycles(self, feature):
+        # iterative tarjan, every component with more than one picture holds at least one cycle
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        counter = 0
+        for root in list(self.wins[feature]):
+            if root in index:
+                continue
+            work = [(root, iter([loser for loser, _ in self.edges(feature, root)]))]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack += [root]
+            on_stack.add(root)
+            while len(work) > 0:
+                idx, successors = work[-1]
+                advanced = False
+                for loser in successors:
+                    if loser not in index:
+                        index[loser] = lowlink[loser] = counter
+                        counter += 1
+                        stack += [loser]
+                        on_stack.add(loser)
+                        work += [(loser, iter([next_loser for next_loser, _ in self.edges(feature, loser)]))]
+                        advanced = True
+                        break
+                    elif loser in on_stack:
+                        lowlink[idx] = min(lowlink[idx], index[loser])
+                if advanced:
+                    continue
+                work.pop()
+                if len(work) > 0:
+                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[idx])
+                if lowlink[idx] == index[idx]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component += [member]
+                        if member == idx:
+                            break
+                    if len(component) > 1:
+                        components += [set(component)]
+        for component in components:
+            # one shortest cycle per component, through an edge inside it
+            start = next(iter(component))
+            loser = next(loser for loser, _ in self.edges(feature, start) if loser in component)
+            parent = {loser: None}
+            queue = deque([loser])
+            while start not in parent:
+                idx = queue.popleft()
+                for next_loser, _ in self.edges(feature, idx):
+                    if next_loser in component and next_loser not in parent:
+                        parent[next_loser] = idx
+                        queue.append(next_loser)
+            path = [start]
+            while path[-1] != loser:
+                path += [parent[path[-1]]]
+            self.contradictions += [(feature, [start] + path[::-1])]
+
+
+class RecordEntries:
+
+    # comparison log as parallel columns, about 11 bytes per entry
+    # entries only turn into RecordEntry objects when asked for one by one
+    features: list
+    feature_ids: dict
+    feature: array
+    idxL: array
+    idxR: array
+    result: array
+
+    results = [">", "<", "=", "x"]
+    dtypes = {"feature": "uint16", "idxL": "uint32", "idxR": "uint32", "result": "uint8"}
+
+    def __init__(self):
+        self.features = []
+        self.feature_ids = {}
+        self.feature = array("H")
+        self.idxL = array("I")
+        self.idxR = array("I")
+        self.result = array("B")
+
+    def __len__(self):
+        return len(self.result)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.entry(j) for j in range(*i.indices(len(self)))]
+        return self.entry(range(len(self))[i])
+
+    def entry(self, i):
+        return Record.RecordEntry(self.features[self.feature[i]], self.idxL[i], self.idxR[i], self.results[self.result[i]])
+
+    def feature_id(self, feature):
+        if feature not in self.feature_ids:
+            self.feature_ids[feature] = len(self.features)
+            self.features += [feature]
+        return self.feature_ids[feature]
+
+    def append(self, feature, idxL, idxR, result):
+        self.feature.append(self.feature_id(feature))
+        self.idxL.append(idxL)
+        self.idxR.append(idxR)
+        self.result.append(self.results.index(result))
+
+    def extend(self, feature, idxL, idxR, result):
+        # bulk append of numpy columns, feature ids already interned here
+        for name, values in [("feature", feature), ("idxL", idxL), ("idxR", idxR), ("result", result)]:
+            getattr(self, name).frombytes(values.astype(self.dtypes[name]).tobytes())
+
+    def column(self, name, start=0):
+        # copied out, numpy views would pin the array buffers and block further appends
+        return np.frombuffer(getattr(self, name)[start:], dtype=self.dtypes[name])
+
+    def select(self, feature):
+        # entries of a single feature, as a new log
+        selected = RecordEntries()
+        if feature not in self.feature_ids:
+            return selected
+        feature_id = self.feature_ids[feature]
+        selected.feature_id(feature)
+        if np is None:
+            for i in range(len(self)):
+                if self.feature[i] == feature_id:
+                    selected.append(feature, self.idxL[i], self.idxR[i], self.results[self.result[i]])
+            return selected
+        mask = self.column("feature") == feature_id
+        selected.extend(np.zeros(np.count_nonzero(mask)), self.column("idxL")[mask], self.column("idxR")[mask], self.column("result")[mask])
+        return selected
+
+    def pic_ids(self):
+        return sorted(set(self.idxL) | set(self.idxR))
+
+
+class FeatureStatistics:
+
+    # comparison counters of one feature, a dense column per counter indexed by picture slot
+    # behaves like the former dict of StatisticsEntry, keyed by picture id
+    slots: dict
+    pref_win: array
+    pref_loss: array
+    share_win: array
+    unfit_loss: array
+
+    counters = ["pref_win", "pref_loss", "share_win", "unfit_loss"]
+
+    def __init__(self, slots):
+        self.slots = slots
+        for counter in self.counters:
+            setattr(self, counter, array("I"))
+        self.grow()
+
+    def grow(self):
+        # pictures may be added to the shared slots later on
+        missing = len(self.slots) - len(self.pref_win)
+        if missing > 0:
+            for counter in self.counters:
+                getattr(self, counter).extend(array("I", [0]) * missing)
+
+    def __contains__(self, idx):
+        return idx in self.slots
+
+    def __getitem__(self, idx):
+        self.grow()
+        slot = self.slots[idx]
+        sentry = Record.StatisticsEntry()
+        for counter in self.counters:
+            setattr(sentry, counter, getattr(self, counter)[slot])
+        return sentry
+
+    def keys(self):
+        return self.slots.keys()
+
+    def add(self, idx, counter):
+        slot = self.slots.get(idx)
+        if slot is None:
+            return
+        self.grow()
+        getattr(self, counter)[slot] += 1
+
+    def add_counts(self, counter, counts):
+        self.grow()
+        column = np.frombuffer(getattr(self, counter), dtype=np.uint32)
+        column += counts[:len(column)].astype(np.uint32)
+        del column
+
+    def column(self, counter):
+        self.grow()
+        return np.frombuffer(getattr(self, counter)[:], dtype=np.uint32)
+
+
+class TextRecordFile:
+
+    # the original comparison log, one "feature,idxL,idxR,result" line per entry
+    path: str
+    offset: int
+    scanned: bool
+    file: object
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.scanned = False
+        self.file = None
+
+    def read(self):
+        self.offset = 0
+        if not os.path.exists(self.path):
+            self.scanned = True
+            return
+        with open(self.path, "rb") as file:
+            for line_number, line in enumerate(file):
+                if not line.endswith(b"\n"):
+                    # torn write at the end, the next append overwrites it
+                    print(f"WARN: dropping torn entry at the end of the record: {line!r}")
+                    break
+                self.offset += len(line)
+                try:
+                    feature, idxL, idxR, result = line.decode().strip().split(",")
+                    entry = (feature, int(idxL), int(idxR), result)
+                except ValueError:
+                    print(f"WARN: skipping malformed record line {line_number + 1}: {line!r}")
+                    continue
+                yield entry
+        self.scanned = True
+
+    def read_into(self, entries):
+        for entry in self.read():
+            entries.append(*entry)
+
+    def open_append(self):
+        if self.file is not None:
+            return
+        if not os.path.exists(self.path):
+            self.file = open(self.path, "wb")
+            return
+        if not self.scanned:
+            # the end of the last whole line is only known after a scan
+            for _ in self.read():
+                pass
+        self.file = open(self.path, "r+b")
+        self.file.seek(self.offset)
+        self.file.truncate()
+
+    def append(self, entries):
+        self.open_append()
+        self.file.write("".join([f"{entry.feature},{entry.idxL},{entry.idxR},{entry.result}\n" for entry in entries]).encode())
+        self.offset = self.file.tell()
+
+    def flush(self, fsync=False):
+        if self.file is not None:
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class BinaryRecordFile:
+
+    # compact comparison log made of fixed-width 12 byte blocks: kind, result, feature id, idxL, idxR
+    # feature names are interned by a definition block (kind 1, result holds the name length),
+    # followed by the zero padded name spread over as many blocks as it needs
+    path: str
+    features: list
+    feature_ids: dict
+    offset: int
+    scanned: bool
+    file: object
+
+    magic = b"ISATARA\x01"
+    block = struct.Struct("<BBHII")
+    results = RecordEntries.results
+
+    def __init__(self, path):
+        self.path = path
+        self.features = []
+        self.feature_ids = {}
+        self.offset = len(self.magic)
+        self.scanned = False
+        self.file = None
+
+    @classmethod
+    def detect(cls, path):
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as file:
+            return file.read(len(cls.magic)) == cls.magic
+
+    def read(self):
+        self.features = []
+        self.feature_ids = {}
+        self.offset = len(self.magic)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= len(self.magic):
+            return
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                size = self.block.size
+                # a torn block at the end is left out
+                end = len(self.magic) + (len(data) - len(self.magic)) // size * size
+                pos = len(self.magic)
+                while pos < end:
+                    kind, result, feature_id, idxL, idxR = self.block.unpack_from(data, pos)
+                    pos += size
+                    if kind == 1:
+                        name_blocks = -(-result // size)
+                        if pos + name_blocks * size > end:
+                            break
+                        name = bytes(data[pos:pos + result]).decode()
+                        pos += name_blocks * size
+                        self.features += [name]
+                        self.feature_ids[name] = feature_id
+                    else:
+                        yield (self.features[feature_id], idxL, idxR, self.results[result])
+                    self.offset = pos
+        self.scanned = True
+
+    def read_into(self, entries):
+        if np is None:
+            for entry in self.read():
+                entries.append(*entry)
+            return
+        self.features = []
+        self.feature_ids = {}
+        self.offset = len(self.magic)
+        self.scanned = True
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= len(self.magic):
+            return
+        size = self.block.size
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                rows = (len(data) - len(self.magic)) // size
+                blocks = np.frombuffer(data, dtype=np.dtype([("kind", "u1"), ("result", "u1"), ("feature", "<u2"), ("idxL", "<u4"), ("idxR", "<u4")]), count=rows, offset=len(self.magic))
+                # definitions are rare, walk them in python and mask out the name blocks following each
+                is_name = np.zeros(rows, dtype=bool)
+                end = rows
+                translate = np.zeros(max(1, int(blocks["feature"].max(initial=0)) + 1), dtype=np.uint16)
+                skip_until = 0
+                for row in np.flatnonzero(blocks["kind"] == 1).tolist():
+                    if row < skip_until:
+                        continue
+                    name_length = int(blocks["result"][row])
+                    name_blocks = -(-name_length // size)
+                    if row + name_blocks >= rows:
+                        # torn definition, drop it and everything after
+                        end = row
+                        break
+                    start = len(self.magic) + (row + 1) * size
+                    name = bytes(data[start:start + name_length]).decode()
+                    feature_id = int(blocks["feature"][row])
+                    self.features += [name]
+                    self.feature_ids[name] = feature_id
+                    if feature_id >= len(translate):
+                        translate = np.concatenate([translate, np.zeros(feature_id + 1 - len(translate), dtype=np.uint16)])
+                    translate[feature_id] = entries.feature_id(name)
+                    is_name[row + 1:row + 1 + name_blocks] = True
+                    skip_until = row + 1 + name_blocks
+                compairs = blocks[:end][(blocks["kind"][:end] == 0) & ~is_name[:end]]
+                entries.extend(translate[compairs["feature"]], compairs["idxL"], compairs["idxR"], compairs["result"])
+                self.offset = len(self.magic) + end * size
+                del blocks, compairs
+
+    def encode(self, entries):
+        chunks = []
+        for entry in entries:
+            if entry.feature not in self.feature_ids:
+                name = entry.feature.encode()
+                name_blocks = -(-len(name) // self.block.size)
+                self.feature_ids[entry.feature] = len(self.features)
+                self.features += [entry.feature]
+                chunks += [self.block.pack(1, len(name), self.feature_ids[entry.feature], 0, 0), name.ljust(name_blocks * self.block.size, b"\0")]
+            chunks += [self.block.pack(0, self.results.index(entry.result), self.feature_ids[entry.feature], entry.idxL, entry.idxR)]
+        return b"".join(chunks)
+
+    def open_append(self):
+        if self.file is not None:
+            return
+        if not os.path.exists(self.path):
+            self.file = open(self.path, "wb")
+            self.file.write(self.magic)
+            self.offset = self.file.tell()
+            return
+        if not self.scanned:
+            # the feature table and the end of the last whole block are only known after a scan
+            for _ in self.read():
+                pass
+        self.file = open(self.path, "r+b")
+        # anything after the last whole block is a torn write, overwrite it
+        self.file.seek(self.offset)
+        self.file.truncate()
+
+    def append(self, entries):
+        self.open_append()
+        self.file.write(self.encode(entries))
+        self.offset = self.file.tell()
+
+    def flush(self, fsync=False):
+        if self.file is not None:
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def open_record_file(path, record_format="text"):
+    # existing logs keep their format, new ones get the requested one
+    if BinaryRecordFile.detect(path) or (not os.path.exists(path) and record_format == "binary"):
+        return BinaryRecordFile(path)
+    return TextRecordFile(path)
+
+
+def convert_record_file(source_path, target_path, record_format):
+    source = open_record_file(source_path)
+    target = BinaryRecordFile(target_path) if record_format == "binary" else TextRecordFile(target_path)
+    batch = []
+    for entry in source.read():
+        batch += [Record.RecordEntry(*entry)]
+        if len(batch) >= 100000:
+            target.append(batch)
+            batch = []
+    target.append(batch)
+    target.close()
+
+
+class RecordJournal:
+
+    # write-behind for a record file, saved entries are queued and a background thread writes them in batches
+    # through the single open handle of the record file, a batch is flushed once it is big or old enough
+    record_file: object
+    batch_size: int
+    flush_interval: float
+    fsync: str
+    pending: list
+    queued: int
+    written: int
+    flush_target: int
+    error: object
+    closed: bool
+    condition: threading.Condition
+    thread: threading.Thread
+
+    def __init__(self, record_file, batch_size=256, flush_interval=1.0, fsync="batch"):
+        self.record_file = record_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.pending = []
+        self.queued = 0
+        self.written = 0
+        self.flush_target = 0
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def submit(self, entries):
+        with self.condition:
+            self.raise_error()
+            if self.thread is None:
+                thread = threading.Thread(target=self.run, name="isatara-journal", daemon=True)
+                try:
+                    thread.start()
+                except RuntimeError:
+                    # no new threads while the interpreter shuts down, a record closed on exit writes on its own
+                    self.write(entries)
+                    self.queued += len(entries)
+                    self.written += len(entries)
+                    return
+                self.thread = thread
+            self.pending += entries
+            self.queued += len(entries)
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self.closed and len(self.pending) < self.batch_size and self.flush_target <= self.written:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.pending
+                self.pending = []
+                closing = self.closed
+            try:
+                self.write(batch)
+            except Exception as error:
+                with self.condition:
+                    self.error = error
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.written += len(batch)
+                self.condition.notify_all()
+                if closing and len(self.pending) == 0:
+                    return
+
+    def write(self, batch):
+        if len(batch) > 0:
+            # save only queues, the time spent on the disk shows up here
+            with profiler.span("journal_write"):
+                self.record_file.append(batch)
+                self.record_file.flush(self.fsync == "batch")
+
+    def flush(self):
+        # blocks until everything submitted so far is written
+        with self.condition:
+            if self.thread is None:
+                return
+            self.flush_target = self.queued
+            self.condition.notify_all()
+            while self.written < self.queued and self.error is None:
+                self.condition.wait()
+            self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise OSError(f"writing the record failed: {self.error}")
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.raise_error()
+        self.record_file.close()
+
+
 class Record:
 
     class StatisticsEntry:
+        __slots__ = ("pref_win", "pref_loss", "share_win", "unfit_loss")
         pref_win: int
         pref_loss: int
         share_win: int
@@ -32,6 +1356,7 @@ class Record:
             self.unfit_loss = 0
 
     class RecordEntry:
+        __slots__ = ("feature", "idxL", "idxR", "result")
         feature: str
         idxL: int
         idxR: int
@@ -42,61 +1367,235 @@ class Record:
             self.idxR = int(idxR)
             self.result = str(result)
 
-    def __init__(self, pics, savepath, compair_mode):
+    def __init__(self, pics, savepath, compair_mode, scorer="winratio", record_format="text", fsync="batch", infer=0, drop_unfit=0, clusters=None):
+        # with near-duplicate clusters only their representatives get compared
+        self.clusters = clusters
+        if clusters is not None:
+            pics = clusters.add(pics)
         self.pic_ids = sorted([pic[0] for pic in pics])
         self.savepath = savepath
         self.compair_mode = compair_mode
-        self.entries = []
+        self.scorer = scorer
+        self.model_scorers = {}
+        self.entries = RecordEntries()
         self.saved_idx = 0
+        self.snapshot_idx = 0
+        self.snapshot_interval = 100000
         self.statistics = {}
-        self.possible_combinations = {}
-        for i, id1 in enumerate(self.pic_ids):
-            for j, id2 in enumerate(self.pic_ids[i+1:]):
-                self.possible_combinations[(id1, id2)] = set()
+        self.rankings = {}
+        self.upcoming = []
+        self.pair_index = PairIndex(self.pic_ids)
+        self.scheduler = SortScheduler(self) if compair_mode == "sort" else PairScheduler(self, compair_mode)
+        self.preferences = PreferenceGraph(self, infer, drop_unfit) if infer > 0 or drop_unfit > 0 else None
+        # without a savepath the record only lives in memory, e.g. for merged logs
+        self.record_file = open_record_file(savepath, record_format) if savepath else None
+        self.journal = RecordJournal(self.record_file, fsync=fsync) if savepath else None
+        self.closed = False
+        if savepath:
+            # the journal thread dies with the interpreter, whatever it still holds gets written out on exit
+            atexit.register(self.close)
         self.load()
+        if clusters is not None and self.mentions([idx for idx, representative in clusters.representative.items() if idx != representative]):
+            print("WARN: judgments of pictures which are not the representative of their cluster are ignored")
 
     def load(self):
-        if os.path.exists(self.savepath):
-            with open(self.savepath) as file:
-                for line in file:
-                    feature, idxL, idxR, result = line.strip().split(",")
-                    self.entries += [self.RecordEntry(feature, idxL, idxR, result)]
+        if self.savepath and os.path.exists(self.savepath):
+            self.record_file.read_into(self.entries)
             self.saved_idx = len(self.entries)
-            for entry in self.entries:
+            # a snapshot covers the statistics and judged pairs of a prefix of the log, only the tail gets replayed
+            self.replay(self.load_snapshot())
+
+    def replay(self, start):
+        if np is None:
+            for i in range(start, len(self.entries)):
+                entry = self.entries[i]
                 self.statistics_add_entry(entry)
-                cpair = tuple(sorted((entry.idxL, entry.idxR)))
-                if entry.feature not in self.possible_combinations[cpair]:
-                    self.possible_combinations[cpair].add(entry.feature)
-                else:
-                    #TODO feature registered twice for the same compair
+                if not self.pair_index.add(entry.idxL, entry.idxR, entry.feature):
+                    #TODO feature registered twice for the same compair, or compair with unknown pictures
                     pass
-                #TODO if we had the whole feature list up front, remove entries we're done with, here
-                # if cpair in self.possible_combinations:
-                #     del self.possible_combinations[cpair]
+            return
+        # whole columns at once, counters are bincounts over picture slots
+        n = len(self.pair_index.slot_ids)
+        feature = self.entries.column("feature", start)
+        result = self.entries.column("result", start)
+        slotL, validL = self.pair_index.lookup_slots(self.entries.column("idxL", start))
+        slotR, validR = self.pair_index.lookup_slots(self.entries.column("idxR", start))
+        feature_ids, first_seen = np.unique(feature, return_index=True)
+        for feature_id in feature_ids[np.argsort(first_seen)].tolist():
+            name = self.entries.features[feature_id]
+            if name not in self.statistics:
+                self.statistics[name] = FeatureStatistics(self.pair_index.slots)
+            mask = feature == feature_id
+            # result codes in order > < = x, seen from the left and from the right picture
+            for slots, valid, counters in [(slotL, validL, ["pref_win", "pref_loss", "share_win", "unfit_loss"]), (slotR, validR, ["pref_loss", "pref_win", "share_win", "unfit_loss"])]:
+                for code, counter in enumerate(counters):
+                    self.statistics[name].add_counts(counter, np.bincount(slots[mask & valid & (result == code)], minlength=n))
+            both = mask & validL & validR & (slotL != slotR)
+            low = np.minimum(slotL[both], slotR[both])
+            high = np.maximum(slotL[both], slotR[both])
+            if name not in self.pair_index.judged:
+                self.pair_index.judged[name] = set()
+            #TODO feature registered twice for the same compair
+            self.pair_index.judged[name].update((high * (high - 1) // 2 + low).tolist())
+        for sampler in self.pair_index.samplers.values():
+            sampler.rebuild()
+        for ranking in self.rankings.values():
+            ranking.rebuild()
 
     def save(self):
-        with open(self.savepath, "a") as file:
-            for entry in self.entries[self.saved_idx:]:
-                file.write(f"{entry.feature},{entry.idxL},{entry.idxR},{entry.result}\n")
+        # queued for the journal thread, so a keypress never waits on the disk
+        if self.journal:
+            self.journal.submit(self.entries[self.saved_idx:])
         self.saved_idx = len(self.entries)
+        if self.saved_idx - self.snapshot_idx >= self.snapshot_interval:
+            self.save_snapshot()
 
-    def get_new_compair(self, features):
-        features_sl = features
-        features = set(features)
-        available_combinations = dict([(cpair, features.difference(avfeatures)) for cpair, avfeatures in self.possible_combinations.items() if not features.issubset(avfeatures)])
-        if len(available_combinations) == 0:
-            return (None, None, [])
-        #TODO for this we need to get elements from the toplist which are not already paired, this requires some more logic..
+    def flush(self):
+        # everything decided so far on disk, including the pair still being decided
+        self.save()
+        if self.journal:
+            self.journal.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.save()
+        self.save_snapshot()
+        if self.journal:
+            self.journal.close()
+            atexit.unregister(self.close)
+
+    def snapshot_path(self):
+        return f"{self.savepath}.snapshot"
+
+    def save_snapshot(self):
+        # only binary logs are checkpointed, the snapshot is tied to the byte offset of the last saved entry
+        if not isinstance(self.record_file, BinaryRecordFile) or self.saved_idx == 0:
+            return
+        self.journal.flush()
+        with open(self.record_file.path, "rb") as file:
+            file.seek(self.record_file.offset - BinaryRecordFile.block.size)
+            last_block = file.read(BinaryRecordFile.block.size)
+        chunks = [b"ISNAP\x01\0\0", struct.pack("<QQ", self.saved_idx, self.record_file.offset), last_block]
+        def pack_array(values):
+            return [struct.pack("<Q", len(values)), values.tobytes()]
+        chunks += pack_array(array("q", self.pair_index.slot_ids))
+        chunks += [struct.pack("<I", len(self.statistics))]
+        for feature, feature_statistics in self.statistics.items():
+            name = feature.encode()
+            chunks += [struct.pack("<H", len(name)), name]
+            feature_statistics.grow()
+            chunks += pack_array(array("q", self.pair_index.slot_ids))
+            for counter in FeatureStatistics.counters:
+                chunks += pack_array(array("Q", getattr(feature_statistics, counter)))
+            chunks += pack_array(array("Q", sorted(self.pair_index.judged.get(feature, ()))))
+        tmp_path = f"{self.snapshot_path()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(b"".join(chunks))
+        os.replace(tmp_path, self.snapshot_path())
+        self.snapshot_idx = self.saved_idx
+
+    def load_snapshot(self):
+        # returns the number of entries covered, zero if there is no usable snapshot
+        if not isinstance(self.record_file, BinaryRecordFile) or not os.path.exists(self.snapshot_path()):
+            return 0
+        with open(self.snapshot_path(), "rb") as file:
+            data = file.read()
+        if data[:8] != b"ISNAP\x01\0\0":
+            return 0
+        entry_count, offset = struct.unpack_from("<QQ", data, 8)
+        last_block = data[24:24 + BinaryRecordFile.block.size]
+        if entry_count > len(self.entries) or offset > self.record_file.offset:
+            return 0
+        with open(self.record_file.path, "rb") as file:
+            file.seek(offset - BinaryRecordFile.block.size)
+            if file.read(BinaryRecordFile.block.size) != last_block:
+                return 0
+        pos = 24 + BinaryRecordFile.block.size
+        def unpack_array(typecode):
+            nonlocal pos
+            count, = struct.unpack_from("<Q", data, pos)
+            values = array(typecode)
+            values.frombytes(data[pos + 8:pos + 8 + count * values.itemsize])
+            pos += 8 + count * values.itemsize
+            return values
+        # judged pair keys are only valid for the same picture slots
+        if list(unpack_array("q")) != self.pair_index.slot_ids:
+            return 0
+        feature_count, = struct.unpack_from("<I", data, pos)
+        pos += 4
+        statistics = {}
+        judged = {}
+        for _ in range(feature_count):
+            name_length, = struct.unpack_from("<H", data, pos)
+            feature = data[pos + 2:pos + 2 + name_length].decode()
+            pos += 2 + name_length
+            ids = unpack_array("q")
+            counters = [unpack_array("Q") for _ in range(4)]
+            statistics[feature] = FeatureStatistics(self.pair_index.slots)
+            for i, idx in enumerate(ids):
+                if idx in self.pair_index.slots:
+                    for counter, values in zip(FeatureStatistics.counters, counters):
+                        getattr(statistics[feature], counter)[self.pair_index.slots[idx]] = values[i]
+            judged[feature] = set(unpack_array("Q"))
+        self.statistics = statistics
+        self.pair_index.judged = judged
+        self.snapshot_idx = entry_count
+        return entry_count
+
+    def select_compair(self, features):
         #TODO mode: reconfirm existing pairs
-        if self.compair_mode == "smart":
-            pass #TODO one favored and one uncertain
-        elif self.compair_mode == "refine":
-            pass #TODO top from toplist by favor
-        elif self.compair_mode == "explore":
-            pass #TODO top from toplist by uncertainty
-        else:
-            cpair = random.choice(list(available_combinations.keys()))
-        return (*cpair, sorted(list(available_combinations[cpair]), key=lambda x: features_sl.index(x)))
+        if self.compair_mode in ["refine", "explore", "smart", "sort"]:
+            return self.scheduler.pick(features)
+        return self.pair_index.sample_open(features)
+
+    def get_new_compair(self, features):
+        # contradictions found in the preferences get a second look first
+        while self.preferences and len(self.preferences.recheck) > 0:
+            cpair, feature = self.preferences.recheck.pop(0)
+            if feature in features:
+                return (*cpair, [feature])
+        # pairs already handed out by peek_compairs come first, as long as they are still open
+        while len(self.upcoming) > 0:
+            cpair = self.upcoming.pop(0)
+            open_features = self.open_compair_features(cpair, features)
+            if len(open_features) > 0:
+                return (*cpair, open_features)
+        # every pair passed over closes for good, so this ends at the latest when nothing is open anymore
+        while True:
+            cpair = self.select_compair(features)
+            if cpair is None:
+                return (None, None, [])
+            open_features = self.open_compair_features(cpair, features)
+            if len(open_features) > 0:
+                return (*cpair, open_features)
+
+    def open_compair_features(self, cpair, features):
+        # open features of a pair, minus those whose result already follows from the preferences
+        open_features = self.pair_index.open_features(*cpair, features)
+        if self.compair_mode == "sort":
+            # only the features whose sort is waiting for this pair
+            open_features = [feature for feature in open_features if self.scheduler.waits_on(cpair, feature)]
+        if self.preferences is None:
+            return open_features
+        kept = []
+        for feature in open_features:
+            if self.preferences.prune(feature, *cpair):
+                self.pair_index.infer(*cpair, feature)
+            else:
+                kept += [feature]
+        return kept
+
+    def peek_compairs(self, features, count):
+        # reserve the next pairs ahead of time, so their pictures can be prefetched
+        # scheduled modes pick these with slightly older estimates, which is fine for a few pairs
+        while len(self.upcoming) < count:
+            cpair = self.select_compair(features)
+            if cpair is None or cpair in self.upcoming:
+                break
+            self.upcoming += [cpair]
+        return self.upcoming[:count]
 
     def add_compair_result(self, compair, feature, result):
         resultTypes = {
@@ -106,73 +1605,878 @@ class Record:
             "right": "<",
         }
         new_entry = self.RecordEntry(feature, *compair, resultTypes[result])
-        self.entries += [new_entry]
+        self.entries.append(new_entry.feature, new_entry.idxL, new_entry.idxR, new_entry.result)
         self.statistics_add_entry(new_entry)
-        cpair = tuple(sorted((new_entry.idxL, new_entry.idxR)))
-        self.possible_combinations[cpair].add(feature)
+        self.pair_index.add(new_entry.idxL, new_entry.idxR, feature)
+        if self.preferences:
+            self.preferences.sync()
 
     def statistics_add_entry(self, recordentry):
         if recordentry.feature not in self.statistics:
-            self.statistics[recordentry.feature] = {}
+            self.statistics[recordentry.feature] = FeatureStatistics(self.pair_index.slots)
         for idx, dir in [(recordentry.idxL, ">"), (recordentry.idxR, "<")]:
-            if idx not in self.statistics[recordentry.feature]:
-                self.statistics[recordentry.feature][idx] = self.StatisticsEntry()
             if recordentry.result == "=":
-                self.statistics[recordentry.feature][idx].share_win += 1
+                self.statistics[recordentry.feature].add(idx, "share_win")
             elif recordentry.result == "x":
-                self.statistics[recordentry.feature][idx].unfit_loss += 1
+                self.statistics[recordentry.feature].add(idx, "unfit_loss")
             elif recordentry.result == dir:
-                self.statistics[recordentry.feature][idx].pref_win += 1
+                self.statistics[recordentry.feature].add(idx, "pref_win")
             else:
-                self.statistics[recordentry.feature][idx].pref_loss += 1
+                self.statistics[recordentry.feature].add(idx, "pref_loss")
+        for ranking in self.rankings.values():
+            if recordentry.feature in ranking.features:
+                ranking.update(recordentry.idxL)
+                ranking.update(recordentry.idxR)
+
+    def judged_features(self):
+        return list(self.statistics.keys())
+
+    def sort_progress(self, features):
+        # per feature the merges left, merges waiting for a judgment, and the order once sorted
+        if self.compair_mode != "sort":
+            return []
+        return [(feature, *self.scheduler.progress(feature), self.scheduler.sort(feature).order()) for feature in features]
+
+    def contradictions(self):
+        if self.preferences is None:
+            return []
+        self.preferences.sync()
+        return self.preferences.contradictions
+
+    def add_pics(self, pics):
+        # pictures found while running, returns the ids that were new
+        if self.clusters is not None:
+            # near-duplicates of known pictures only join the toplists
+            pics = self.clusters.add(pics)
+        new_ids = sorted(set(pic[0] for pic in pics) - set(self.pair_index.slots))
+        if len(new_ids) == 0:
+            return []
+        self.pair_index.add_pics(new_ids)
+        self.pic_ids = sorted(self.pic_ids + new_ids)
+        if self.mentions(new_ids):
+            # the log already compared some of them, entries which were skipped so far need a full replay
+            self.statistics = {}
+            self.pair_index.judged = {}
+            self.pair_index.samplers = {}
+            self.model_scorers = {}
+            self.replay(0)
+        # certainties depend on the collection size, so every score moves
+        for ranking in self.rankings.values():
+            ranking.rebuild()
+        if self.compair_mode == "sort":
+            self.scheduler.reset()
+        return new_ids
+
+    def mentions(self, pic_ids):
+        if np is None:
+            pic_ids = set(pic_ids)
+            return any(idx in pic_ids for idx in self.entries.idxL) or any(idx in pic_ids for idx in self.entries.idxR)
+        pic_ids = np.array(pic_ids)
+        return bool(np.isin(self.entries.column("idxL"), pic_ids).any() or np.isin(self.entries.column("idxR"), pic_ids).any())
+
+    def feature_score(self, features, idx):
+        favor_acc = 0
+        certainty_acc = 0
+        for feature in features:
+            if feature in self.statistics and idx in self.statistics[feature]:
+                sentry = self.statistics[feature][idx]
+            else:
+                sentry = self.StatisticsEntry()
+            wins = sentry.pref_win + sentry.share_win
+            losses = sentry.pref_loss + sentry.unfit_loss
+            totals = wins + losses
+            local_certainty = totals / max(1, len(self.pic_ids) - 1)
+            probable_error = 1 - (local_certainty) #TODO could set to just one to be true review
+            wins += probable_error
+            losses += probable_error
+            totals = wins + losses
+            favor_acc += (wins / totals) * (1 / len(features))
+            certainty_acc += local_certainty * (1 / len(features))
+        return (favor_acc, certainty_acc)
+
+    def feature_scores(self, features):
+        # feature_score for every picture, as whole column operations where numpy is available
+        if np is None or len(self.pic_ids) == 0:
+            return dict([(idx, self.feature_score(features, idx)) for idx in self.pic_ids])
+        slots = np.array([self.pair_index.slots[idx] for idx in self.pic_ids])
+        favor_acc = np.zeros(len(slots))
+        certainty_acc = np.zeros(len(slots))
+        for feature in features:
+            if feature in self.statistics:
+                columns = dict([(counter, self.statistics[feature].column(counter)[slots].astype(np.float64)) for counter in FeatureStatistics.counters])
+            else:
+                columns = dict([(counter, np.zeros(len(slots))) for counter in FeatureStatistics.counters])
+            wins = columns["pref_win"] + columns["share_win"]
+            losses = columns["pref_loss"] + columns["unfit_loss"]
+            totals = wins + losses
+            local_certainty = totals / max(1, len(self.pic_ids) - 1)
+            probable_error = 1 - (local_certainty)
+            wins += probable_error
+            losses += probable_error
+            totals = wins + losses
+            favor_acc += (wins / totals) * (1 / len(features))
+            certainty_acc += local_certainty * (1 / len(features))
+        return dict(zip(self.pic_ids, zip(favor_acc.tolist(), certainty_acc.tolist())))
+
+    def ranking(self, features):
+        features = tuple(features)
+        if features not in self.rankings:
+            self.rankings[features] = Ranking(self, features)
+        return self.rankings[features]
+
+    def calculate_feature_intervals(self, feature, scorer=None):
+        # per picture (score, low, high) of a model scorer, None while the feature has no entries
+        scorer = scorer if scorer else self.scorer
+        if scorer not in self.model_scorers:
+            self.model_scorers[scorer] = ModelScorer(self, scorer)
+        scores = self.model_scorers[scorer].fit(feature)
+        if scores is None:
+            return None
+        slots = self.pair_index.slots
+        return dict([(idx, tuple(scores[slots[idx]].tolist())) for idx in self.pic_ids])
 
     #TODO maybe weight for features
-    def calculate_feature_toplist(self, features, sortby="favor"):
+    def calculate_feature_toplist(self, features, sortby="favor", k=None, scorer=None):
         if not type(features) is list:
             features = [features]
-        #TODO do pagerank..
+        scorer = scorer if scorer else self.scorer
+        if scorer != "winratio":
+            return self.spread_toplist(self.calculate_model_toplist(features, sortby, k, scorer), k)
+        # features without any statistics yet rank everyone as undecided, instead of voiding the toplist
+        ranking = self.ranking(features)
+        if sortby == "favor":
+            order = ranking.by_favor
+        elif sortby == "confidence":
+            order = ranking.by_certainty
+        else:
+            print("WARN: unknown sorting style")
+            return self.spread_toplist([(idx, *ranking.scores[idx]) for idx in self.pic_ids][:k], k)
+        return self.spread_toplist([(-key[1], *ranking.scores[-key[1]]) for key in order[:k]], k)
+
+    def spread_toplist(self, toplist, k):
+        if self.clusters is None:
+            return toplist
+        return self.clusters.spread(toplist)[:k]
+
+    def calculate_model_toplist(self, features, sortby, k, scorer):
+        # certainty is one minus the width of the confidence interval
+        intervals = [self.calculate_feature_intervals(feature, scorer) for feature in features]
         toplist = []
-        for feature in features:
-            if feature not in self.statistics:
-                return toplist #TODO can somehow do it with just partial statistics?
         for idx in self.pic_ids:
-            favor_acc = 0
+            score_acc = 0
             certainty_acc = 0
-            for feature in features:
-                if idx in self.statistics[feature]:
-                    sentry = self.statistics[feature][idx]
-                else:
-                    sentry = self.StatisticsEntry()
-                wins = sentry.pref_win + sentry.share_win
-                losses = sentry.pref_loss + sentry.unfit_loss
-                totals = wins + losses
-                local_certainty = totals / (len(self.pic_ids) - 1)
-                probable_error = 1 - (local_certainty) #TODO could set to just one to be true review
-                wins += probable_error
-                losses += probable_error
-                totals = wins + losses
-                favor_acc += (wins / totals) * (1 / len(features))
-                certainty_acc += local_certainty * (1 / len(features))
-            toplist += [(idx, favor_acc, certainty_acc)]
+            for feature_intervals in intervals:
+                score, low, high = feature_intervals[idx] if feature_intervals else (0.5, 0, 1)
+                score_acc += score * (1 / len(features))
+                certainty_acc += (1 - (high - low)) * (1 / len(features))
+            toplist += [(idx, score_acc, certainty_acc)]
         if sortby == "favor":
-            toplist.sort(key=lambda x: x[1])
-            toplist = reversed(toplist)
+            toplist.sort(key=lambda x: (x[1], x[0]), reverse=True)
         elif sortby == "confidence":
-            toplist.sort(key=lambda x: x[2])
-            toplist = reversed(toplist)
+            toplist.sort(key=lambda x: (x[2], x[0]), reverse=True)
         else:
             print("WARN: unknown sorting style")
-        return list(toplist)
+        return toplist[:k]
+
+
+class ModelScorer:
+
+    # opponent aware scores per feature, fitted over the comparison log with numpy
+    # pairs are aggregated into coordinate lists, so a sweep over millions of comparisons is a few bincounts
+    # a refit starts from the previous solution, and elo only replays the entries appended since
+    record: "Record"
+    method: str
+    consumed: int
+    columns: dict
+    fits: dict
+
+    def __init__(self, record, method):
+        self.record = record
+        self.method = method
+        self.consumed = 0
+        self.columns = {}
+        self.fits = {}
+
+    def sync(self):
+        entries = self.record.entries
+        if self.consumed == len(entries):
+            return
+        feature = entries.column("feature", self.consumed)
+        result = entries.column("result", self.consumed)
+        slotL, validL = self.record.pair_index.lookup_slots(entries.column("idxL", self.consumed))
+        slotR, validR = self.record.pair_index.lookup_slots(entries.column("idxR", self.consumed))
+        for feature_id in np.unique(feature).tolist():
+            name = entries.features[feature_id]
+            mask = (feature == feature_id) & validL & validR
+            appended = (slotL[mask], slotR[mask], result[mask])
+            if name in self.columns:
+                appended = tuple(np.concatenate([old, new]) for old, new in zip(self.columns[name], appended))
+            self.columns[name] = appended
+        self.consumed = len(entries)
+
+    def fit(self, feature):
+        # returns per slot (score, low, high), with score and the 95% interval as win chance against an average picture
+        self.sync()
+        n = len(self.record.pair_index.slot_ids)
+        if feature not in self.columns:
+            return None
+        count = len(self.columns[feature][0])
+        if feature in self.fits and self.fits[feature]["count"] == count and len(self.fits[feature]["theta"]) == n:
+            return self.fits[feature]["scores"]
+        left, right, result = self.columns[feature]
+        previous = self.fits.get(feature)
+        if self.method == "bradleyterry":
+            theta, state = self.fit_bradleyterry(n, left, right, result, previous)
+        elif self.method == "elo":
+            theta, state = self.fit_elo(n, left, right, result, previous)
+        else:
+            theta, state = self.fit_pagerank(n, left, right, result, previous)
+        # fisher information of the bradley-terry likelihood at theta, including the virtual games against an average picture
+        decided = result != 3
+        pairs_u, pairs_v, pairs_count = self.aggregate(n, left[decided], right[decided])
+        p = 1 / (1 + np.exp(theta[pairs_v] - theta[pairs_u]))
+        information = np.bincount(pairs_u, pairs_count * p * (1 - p), minlength=n) + np.bincount(pairs_v, pairs_count * p * (1 - p), minlength=n)
+        virtual_games = 1 + np.bincount(left[~decided], minlength=n) + np.bincount(right[~decided], minlength=n)
+        p0 = 1 / (1 + np.exp(-theta))
+        information += virtual_games * p0 * (1 - p0)
+        margin = 1.96 / np.sqrt(information)
+        scores = np.stack([p0, 1 / (1 + np.exp(-(theta - margin))), 1 / (1 + np.exp(-(theta + margin)))], axis=1)
+        self.fits[feature] = {"count": count, "theta": theta, "state": state, "scores": scores}
+        return scores
+
+    @staticmethod
+    def aggregate(n, u, v):
+        # unordered pairs with their number of games
+        low = np.minimum(u, v)
+        high = np.maximum(u, v)
+        keys, counts = np.unique(low * n + high, return_counts=True)
+        return (keys // n, keys % n, counts.astype(np.float64))
+
+    @staticmethod
+    def warm_start(n, previous, key, default):
+        start = np.full(n, default, dtype=np.float64)
+        if previous is not None:
+            known = previous["state"][key]
+            start[:len(known)] = known[:n]
+        return start
+
+    def fit_bradleyterry(self, n, left, right, result, previous, tolerance=1e-6, max_iterations=100):
+        # newton steps on the log strengths, each solved with jacobi preconditioned conjugate gradients,
+        # anchored by one virtual tie per picture against an average picture, which keeps undefeated pictures finite;
+        # an unfit mark counts as a loss against that virtual picture
+        decided = result != 3
+        wins = np.full(n, 0.5)
+        wins += np.bincount(left[result == 0], minlength=n) + np.bincount(right[result == 1], minlength=n)
+        wins += 0.5 * (np.bincount(left[result == 2], minlength=n) + np.bincount(right[result == 2], minlength=n))
+        virtual_games = 1 + np.bincount(left[~decided], minlength=n) + np.bincount(right[~decided], minlength=n)
+        pairs_u, pairs_v, pairs_count = self.aggregate(n, left[decided], right[decided])
+        theta = self.warm_start(n, previous, "theta", 0.0)
+        for _ in range(max_iterations):
+            p = 1 / (1 + np.exp(theta[pairs_v] - theta[pairs_u]))
+            p0 = 1 / (1 + np.exp(-theta))
+            expected = np.bincount(pairs_u, pairs_count * p, minlength=n) + np.bincount(pairs_v, pairs_count * (1 - p), minlength=n) + virtual_games * p0
+            weight = pairs_count * p * (1 - p)
+            diagonal = np.bincount(pairs_u, weight, minlength=n) + np.bincount(pairs_v, weight, minlength=n) + virtual_games * p0 * (1 - p0)
+            def hessian_product(x):
+                return diagonal * x - np.bincount(pairs_u, weight * x[pairs_v], minlength=n) - np.bincount(pairs_v, weight * x[pairs_u], minlength=n)
+            step = self.conjugate_gradient(hessian_product, wins - expected, diagonal)
+            # damped, full newton steps overshoot on chain-like judgments such as those of a merge sort
+            step *= min(1.0, 2.0 / max(np.max(np.abs(step)), 1e-12))
+            theta += step
+            if np.max(np.abs(step)) < tolerance:
+                break
+        return (theta, {"theta": theta})
+
+    @staticmethod
+    def conjugate_gradient(product, rhs, diagonal, tolerance=1e-10, max_iterations=200):
+        x = np.zeros_like(rhs)
+        residual = rhs.copy()
+        z = residual / diagonal
+        direction = z.copy()
+        rz = residual @ z
+        for _ in range(max_iterations):
+            if rz < tolerance:
+                break
+            q = product(direction)
+            alpha = rz / (direction @ q)
+            x += alpha * direction
+            residual -= alpha * q
+            z = residual / diagonal
+            rz_next = residual @ z
+            direction = z + (rz_next / rz) * direction
+            rz = rz_next
+        return x
+
+    def fit_elo(self, n, left, right, result, previous, k_factor=32):
+        # sequential by nature, so it is replayed incrementally from where the last fit stopped
+        ratings = self.warm_start(n, previous, "ratings", 1500.0).tolist()
+        start = previous["state"]["replayed"] if previous is not None else 0
+        outcome = [1, 0, 0.5, None]
+        for l, r, code in zip(left[start:].tolist(), right[start:].tolist(), result[start:].tolist()):
+            if code == 3:
+                for idx in [l, r]:
+                    expected = 1 / (1 + 10 ** ((1500 - ratings[idx]) / 400))
+                    ratings[idx] -= k_factor * expected
+                continue
+            expected = 1 / (1 + 10 ** ((ratings[r] - ratings[l]) / 400))
+            delta = k_factor * (outcome[code] - expected)
+            ratings[l] += delta
+            ratings[r] -= delta
+        ratings = np.array(ratings)
+        return ((ratings - 1500) * math.log(10) / 400, {"ratings": ratings, "replayed": len(left)})
+
+    def fit_pagerank(self, n, left, right, result, previous, damping=0.85, tolerance=1e-10, max_iterations=1000):
+        # losers link to winners, ties link both ways with half weight
+        source = np.concatenate([right[result == 0], left[result == 1], left[result == 2], right[result == 2]])
+        target = np.concatenate([left[result == 0], right[result == 1], right[result == 2], left[result == 2]])
+        weight = np.concatenate([np.ones(np.count_nonzero(result == 0) + np.count_nonzero(result == 1)), np.full(2 * np.count_nonzero(result == 2), 0.5)])
+        out_weight = np.bincount(source, weight, minlength=n)
+        dangling = out_weight == 0
+        rank = self.warm_start(n, previous, "rank", 1 / n)
+        rank /= rank.sum()
+        for _ in range(max_iterations):
+            flow = np.bincount(target, weight * rank[source] / out_weight[source], minlength=n)
+            updated = (1 - damping) / n + damping * (flow + rank[dangling].sum() / n)
+            change = np.abs(updated - rank).sum()
+            rank = updated
+            if change < tolerance:
+                break
+        # relative to a uniform rank, read as a log strength; the interval reuses the bradley-terry approximation
+        return (np.log(rank * n), {"rank": rank})
+
+
+class Ranking:
+
+    # live toplist for one feature combination, kept sorted by favor and by certainty
+    # an added entry only changes the scores of its two pictures, so updates never rescan the collection
+    record: Record
+    features: tuple
+    scores: dict
+    by_favor: list
+    by_certainty: list
+
+    def __init__(self, record, features):
+        self.record = record
+        self.features = features
+        self.rebuild()
+
+    def rebuild(self):
+        self.scores = self.record.feature_scores(self.features)
+        # sort keys are negated, so ascending order lists the best first and ties by descending id
+        self.by_favor = sorted([(-favor, -idx) for idx, (favor, certainty) in self.scores.items()])
+        self.by_certainty = sorted([(-certainty, -idx) for idx, (favor, certainty) in self.scores.items()])
+
+    def update(self, idx):
+        if idx not in self.scores:
+            return
+        old_favor, old_certainty = self.scores[idx]
+        favor, certainty = self.record.feature_score(self.features, idx)
+        self.scores[idx] = (favor, certainty)
+        for order, old_key, key in [(self.by_favor, (-old_favor, -idx), (-favor, -idx)), (self.by_certainty, (-old_certainty, -idx), (-certainty, -idx))]:
+            if old_key != key:
+                del order[bisect.bisect_left(order, old_key)]
+                bisect.insort(order, key)
+
+
+class ImagePrefetcher:
+
+    # decodes and downscales upcoming pictures on worker threads, so the ui thread only swaps them in
+    # completed pictures are kept within a byte budget, anything no longer upcoming gets cancelled or dropped
+    loader: object
+    budget: int
+    executor: ThreadPoolExecutor
+    futures: OrderedDict
+
+    def __init__(self, loader, workers=2, budget=256 * 1024 * 1024):
+        self.loader = loader
+        self.budget = budget
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = OrderedDict()
+
+    @staticmethod
+    def image_bytes(future):
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            return 0
+        image = future.result()
+        return image.width * image.height * len(image.getbands())
+
+    def request(self, pic_ids):
+        for pic_id in pic_ids:
+            if pic_id in self.futures:
+                continue
+            if sum(self.image_bytes(future) for future in self.futures.values()) >= self.budget:
+                # over budget, the rest gets loaded on demand
+                break
+            self.futures[pic_id] = self.executor.submit(self.loader, pic_id)
+
+    def get(self, pic_id):
+        if pic_id not in self.futures:
+            self.futures[pic_id] = self.executor.submit(self.loader, pic_id)
+        self.futures.move_to_end(pic_id)
+        return self.futures[pic_id].result()
+
+    def retain(self, pic_ids):
+        for pic_id in [pic_id for pic_id in self.futures if pic_id not in pic_ids]:
+            self.futures.pop(pic_id).cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RenditionCache:
+
+    # display sized renditions keyed by (picture id, width, height), least recently used ones get evicted over the byte limit
+    limit: int
+    size: int
+    entries: OrderedDict
+
+    def __init__(self, limit=128 * 1024 * 1024):
+        self.limit = limit
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.limit and len(self.entries) > 1:
+            self.size -= self.entries.popitem(last=False)[1][1]
+
+
+def load_display_image(path, max_size):
+    with profiler.span("decode"):
+        image = Image.open(path)
+        # let the jpeg decoder skip detail we could not display anyway
+        image.draft(image.mode, max_size)
+        image.load()
+    if image.width > max_size[0] or image.height > max_size[1]:
+        with profiler.span("downscale"):
+            image.thumbnail(max_size, Image.LANCZOS)
+    return image
+
+
+class PreviewStore:
+
+    # pre-scaled copies of the pictures, so showing one is a single small read instead of a full decode
+    # files are keyed by picture path, mtime and size, an edited picture simply misses and gets rebuilt
+    directory: str
+    size: int
+
+    # files the store writes, the key with its extension, or a temporary file of a builder
+    layout = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{40}(\.\d+(-\d+)?\.tmp)?\.(jpg|png)$")
+
+    def __init__(self, directory, size=2560):
+        self.directory = directory
+        self.size = size
+
+    def relative(self, path):
+        return os.path.relpath(path, self.directory).replace(os.sep, "/")
+
+    def listing_path(self, pics_base):
+        # previews built for one picture directory, so a shared store never prunes those of another one
+        digest = hashlib.sha1(os.path.abspath(pics_base).encode()).hexdigest()
+        return os.path.join(self.directory, "roots", f"{digest}.json")
+
+    def key_path(self, path):
+        stat = os.stat(path)
+        digest = hashlib.sha1(f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{self.size}".encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def load(self, path):
+        key_path = self.key_path(path)
+        for ext in [".jpg", ".png"]:
+            if os.path.exists(key_path + ext):
+                with profiler.span("preview_decode"):
+                    image = Image.open(key_path + ext)
+                    image.load()
+                return image
+        return None
+
+    def build(self, path):
+        key_path = self.key_path(path)
+        image = load_display_image(path, (self.size, self.size))
+        if image.mode in ["RGB", "L"]:
+            ext = ".jpg"
+        else:
+            image = image.convert("RGBA")
+            ext = ".png"
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        # write aside and rename, so concurrent builders and readers never see half a preview,
+        # the prefetcher threads of one app are builders too
+        tmp_path = f"{key_path}.{os.getpid()}-{threading.get_ident()}.tmp{ext}"
+        image.save(tmp_path, quality=90)
+        os.replace(tmp_path, key_path + ext)
+        return image
+
+    def get(self, path):
+        image = self.load(path)
+        if image is None:
+            image = self.build(path)
+        return image
+
+    def known_files(self, paths):
+        files = set()
+        for path in paths:
+            key_path = self.key_path(path)
+            files.update([key_path + ".jpg", key_path + ".png"])
+        return files
+
+
+def build_preview(directory, size, path):
+    store = PreviewStore(directory, size)
+    if store.load(path) is not None:
+        return False
+    store.build(path)
+    return True
+
+
+def build_previews(store, pics_base, pics):
+    paths = [f"{pics_base}/{filename}" for _, filename in pics]
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        built = list(executor.map(build_preview, [store.directory] * len(paths), [store.size] * len(paths), paths, chunksize=16))
+    # drop previews of pictures which changed or are gone, but only those listed by an earlier build for this directory
+    known = set(store.relative(path) for path in store.known_files(paths))
+    listing_path = store.listing_path(pics_base)
+    listed = []
+    if os.path.exists(listing_path):
+        with open(listing_path) as file:
+            listed = json.load(file)
+    pruned = 0
+    for relative in listed:
+        path = os.path.join(store.directory, relative)
+        if relative not in known and store.layout.match(relative) and os.path.exists(path):
+            os.remove(path)
+            pruned += 1
+    # temporary files of builders which died, anything not written by the store is left alone
+    for subdir in os.listdir(store.directory):
+        if not re.fullmatch(r"[0-9a-f]{2}", subdir) or not os.path.isdir(os.path.join(store.directory, subdir)):
+            continue
+        for filename in os.listdir(os.path.join(store.directory, subdir)):
+            path = os.path.join(store.directory, subdir, filename)
+            match = store.layout.match(f"{subdir}/{filename}")
+            if match and match.group(1) and time.time() - os.path.getmtime(path) > 3600:
+                os.remove(path)
+                pruned += 1
+    os.makedirs(os.path.dirname(listing_path), exist_ok=True)
+    with open(listing_path, "w") as file:
+        json.dump(sorted(relative for relative in known if os.path.exists(os.path.join(store.directory, relative))), file)
+    print(f"previews: {sum(built)} built, {len(built) - sum(built)} up to date, {pruned} pruned")
+
+
+class RecordServer:
+
+    # owns the record for several raters at once, speaking newline delimited json over tcp
+    # pairs are leased to one client at a time, leases expire after a while so abandoned pairs come back
+    # every request runs on the event loop, so results reach the record and its log one after another
+    class Lease:
+        __slots__ = ("lease_id", "cpair", "features", "expires")
+        lease_id: int
+        cpair: tuple
+        features: list
+        expires: float
+        def __init__(self, lease_id, cpair, features, expires):
+            self.lease_id = lease_id
+            self.cpair = cpair
+            self.features = features
+            self.expires = expires
+
+    record: Record
+    lease_timeout: float
+    attempts: int
+    manifest: "PictureManifest"
+    rescan_interval: float
+    leases: OrderedDict
+    leased: dict
+    next_lease_id: int
+    loop: asyncio.AbstractEventLoop
+    stopping: asyncio.Event
+    port: int
+
+    def __init__(self, record, lease_timeout=300.0, attempts=32, manifest=None, rescan_interval=0):
+        self.record = record
+        self.lease_timeout = lease_timeout
+        self.attempts = attempts
+        self.manifest = manifest
+        self.rescan_interval = rescan_interval
+        # ordered by expiry, renewed leases move to the end
+        self.leases = OrderedDict()
+        self.leased = {}
+        self.next_lease_id = 1
+        self.loop = None
+        self.stopping = None
+        self.port = None
+
+    async def serve(self, host, port, ready=None):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready:
+            ready.set()
+        rescanning = asyncio.create_task(self.rescan()) if self.manifest and self.rescan_interval > 0 else None
+        async with server:
+            await self.stopping.wait()
+        if rescanning:
+            rescanning.cancel()
+        self.record.close()
+
+    async def rescan(self):
+        # pictures added to the directory join the record while serving
+        while True:
+            await asyncio.sleep(self.rescan_interval)
+            generation = self.manifest.generation
+            pics = await asyncio.to_thread(self.manifest.scan)
+            if self.manifest.generation == generation:
+                continue
+            new_ids = self.record.add_pics(pics)
+            if len(new_ids) > 0:
+                print(f"added {len(new_ids)} new pictures")
+
+    def stop(self):
+        # callable from any thread
+        self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = self.dispatch(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"error": f"bad request: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def dispatch(self, request):
+        op = request["op"]
+        if op == "lease":
+            return self.lease(request["features"], request.get("count", 1), request.get("release", []))
+        elif op == "result":
+            return self.result(request["lease"], tuple(request["pair"]), request["feature"], request["result"])
+        elif op == "release":
+            for lease_id in request["leases"]:
+                self.release(lease_id)
+            return {"ok": True}
+        elif op == "toplist":
+            return {"toplist": self.record.calculate_feature_toplist(request["features"], request.get("sortby", "favor"), request.get("k"))}
+        elif op == "features":
+            return {"features": self.record.judged_features()}
+        elif op == "contradictions":
+            return {"contradictions": self.record.contradictions()}
+        elif op == "sort_progress":
+            return {"sort_progress": self.record.sort_progress(request["features"])}
+        return {"error": f"unknown op: {op}"}
+
+    def reclaim(self):
+        now = time.monotonic()
+        while len(self.leases) > 0:
+            lease = next(iter(self.leases.values()))
+            if lease.expires > now:
+                break
+            self.release(lease.lease_id)
+
+    def release(self, lease_id):
+        lease = self.leases.pop(lease_id, None)
+        if lease and self.leased.get(lease.cpair) == lease_id:
+            del self.leased[lease.cpair]
+
+    def lease(self, features, count, release):
+        for lease_id in release:
+            self.release(lease_id)
+        self.reclaim()
+        leases = []
+        done = False
+        while len(leases) < count and not done:
+            # pairs out on lease are drawn again now and then, those draws are retried
+            for _ in range(self.attempts):
+                idxL, idxR, open_features = self.record.get_new_compair(features)
+                if idxL is None:
+                    done = True
+                    break
+                cpair = tuple(sorted((idxL, idxR)))
+                if cpair not in self.leased:
+                    break
+            else:
+                break
+            if done:
+                break
+            lease = self.Lease(self.next_lease_id, cpair, list(open_features), time.monotonic() + self.lease_timeout)
+            self.next_lease_id += 1
+            self.leases[lease.lease_id] = lease
+            self.leased[cpair] = lease.lease_id
+            leases += [{"lease": lease.lease_id, "pair": [idxL, idxR], "features": lease.features}]
+        # done means nothing is left to compare, an empty list otherwise only means every open pair is out on lease
+        return {"leases": leases, "done": done}
+
+    def result(self, lease_id, cpair, feature, result):
+        if result not in ["none", "both", "left", "right"]:
+            return {"error": f"unknown result: {result}"}
+        # a late result on an expired lease still counts, unless another rater judged the pair meanwhile or holds it now
+        lease = self.leases.get(lease_id)
+        leased = lease is not None and lease.cpair == tuple(sorted(cpair)) and feature in lease.features
+        holder = self.leased.get(tuple(sorted(cpair)))
+        if not leased and (not self.record.pair_index.is_open(*cpair, feature) or (holder is not None and holder != lease_id)):
+            return {"ok": False}
+        self.record.add_compair_result(cpair, feature, result)
+        self.record.save()
+        if lease and lease.cpair == tuple(sorted(cpair)):
+            if feature in lease.features:
+                lease.features.remove(feature)
+            if len(lease.features) == 0:
+                self.release(lease_id)
+            else:
+                lease.expires = time.monotonic() + self.lease_timeout
+                self.leases.move_to_end(lease_id)
+        return {"ok": True}
+
+
+class RecordClient:
+
+    # stands in for the record in the app, forwarding to a record server
+    # leased pairs queue up locally, which is also what the prefetcher gets to see
+    host: str
+    port: int
+    socket: socket.socket
+    file: object
+    queue: list
+    current: int
+    released: list
+    done: bool
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        try:
+            self.socket = socket.create_connection((host, port))
+        except OSError as e:
+            print(f"ERROR: cannot connect to record server {host}:{port}: {e}")
+            exit()
+        self.file = self.socket.makefile("rwb")
+        self.queue = []
+        self.current = None
+        self.released = []
+        # an empty queue while not done means every open compair is out on lease, worth asking again later
+        self.done = False
+
+    def request(self, **request):
+        try:
+            self.file.write(json.dumps(request).encode() + b"\n")
+            self.file.flush()
+            line = self.file.readline()
+        except OSError:
+            line = b""
+        if not line:
+            print("ERROR: lost connection to the record server")
+            exit()
+        response = json.loads(line)
+        if "error" in response:
+            print(f"ERROR: record server: {response["error"]}")
+            exit()
+        return response
+
+    def lease(self, features, count):
+        # leases of pairs left behind go back along with the next request
+        response = self.request(op="lease", features=features, count=count, release=self.released)
+        self.released = []
+        self.done = response["done"]
+        self.queue += [(lease["lease"], tuple(lease["pair"]), lease["features"]) for lease in response["leases"]]
+
+    def get_new_compair(self, features):
+        if self.current:
+            self.released += [self.current]
+            self.current = None
+        if len(self.queue) == 0:
+            self.lease(features, 1)
+        if len(self.queue) == 0:
+            return (None, None, [])
+        self.current, cpair, open_features = self.queue.pop(0)
+        return (*cpair, open_features)
+
+    def peek_compairs(self, features, count):
+        if len(self.queue) < count:
+            self.lease(features, count - len(self.queue))
+        return [cpair for _, cpair, _ in self.queue[:count]]
+
+    def add_compair_result(self, compair, feature, result):
+        return self.request(op="result", lease=self.current, pair=list(compair), feature=feature, result=result)["ok"]
+
+    def calculate_feature_toplist(self, features, sortby="favor", k=None):
+        if not type(features) is list:
+            features = [features]
+        return self.request(op="toplist", features=features, sortby=sortby, k=k)["toplist"]
+
+    def judged_features(self):
+        return self.request(op="features")["features"]
+
+    def add_pics(self, pics):
+        # the server rescans the picture directory by itself
+        return []
+
+    def contradictions(self):
+        return [tuple(contradiction) for contradiction in self.request(op="contradictions")["contradictions"]]
+
+    def sort_progress(self, features):
+        return [tuple(progress) for progress in self.request(op="sort_progress", features=features)["sort_progress"]]
+
+    def save(self):
+        # results are written by the server as they arrive
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        leases = self.released + [lease_id for lease_id, _, _ in self.queue] + ([self.current] if self.current else [])
+        if len(leases) > 0:
+            self.request(op="release", leases=leases)
+        self.queue = []
+        self.current = None
+        self.released = []
+        self.file.close()
+        self.socket.close()
 
 
 class App:
 
-    def __init__(self, pics_base, pics, record_path, comp_features, compair_mode):
+    def __init__(self, pics_base, pics, record, comp_features, prefetch, previews=None, manifest=None, rescan_interval=0, profile_path=None, profile_format="chrome"):
         self.pics_base = pics_base
         self.pics = dict(pics)
-        self.record = Record(pics, record_path, compair_mode)
+        self.manifest = manifest
+        self.manifest_generation = manifest.generation if manifest else 0
+        self.rescan_interval = rescan_interval
+        # scans relist changed directories, which can take a second for a large flat one, so they run aside
+        self.scanner = ThreadPoolExecutor(max_workers=1) if manifest else None
+        self.scanning = None
+        self.profile_path = profile_path
+        self.profile_format = profile_format
+        if profile_path:
+            profiler.start(tracing=True)
+        # a local record, or a client of a record server shared with other raters
+        self.record = record
 
+        import_gui()
         root = tk.Tk()
+        max_size = (root.winfo_screenwidth(), root.winfo_screenheight())
+        self.prefetch = prefetch
+        self.renditions = RenditionCache()
+        self.overlay_strips = RenditionCache(32 * 1024 * 1024)
+        self.rendition_bucket = 16
+        self.settle_delay = 150
+        self.previews = previews
+        self.prefetcher = ImagePrefetcher(lambda pic_id: self.load_image(pic_id, max_size), workers=max(1, min(4, os.cpu_count() or 1)))
         if len(comp_features) == 0:
             self.title = f"Pairwise Scoring: <general>"
             comp_features = ["*"]
@@ -210,6 +2514,8 @@ class App:
         for i in range(len(comp_features)):
             imgFeatureHighlight = tk.Label(imgFeatureHighlightContainerL, bg="lightyellow", text="")
             imgFeatureHighlight.pack(anchor="n", expand=True, fill="both")
+            imgFeatureHighlight._shown = True
+            imgFeatureHighlight._bg = "lightyellow"
             imgFeatureHighlightContainerL.highlights += [imgFeatureHighlight]
 
         imgFrameR = tk.Frame(compairFrame, bg="lightyellow")
@@ -231,6 +2537,8 @@ class App:
         for i in range(len(comp_features)):
             imgFeatureHighlight = tk.Label(imgFeatureHighlightContainerR, bg="lightyellow", text="")
             imgFeatureHighlight.pack(anchor="n", expand=True, fill="both")
+            imgFeatureHighlight._shown = True
+            imgFeatureHighlight._bg = "lightyellow"
             imgFeatureHighlightContainerR.highlights += [imgFeatureHighlight]
 
         compairFrame.bind("<r>", lambda event: self.compair_skip())
@@ -243,19 +2551,36 @@ class App:
 
         metaevalFrame = tk.Frame(root)
         tk.Label(metaevalFrame, text="meta-eval").pack()
+        leaderboardLabel = tk.Label(metaevalFrame, text="", font="TkFixedFont", justify="left", anchor="nw")
+        leaderboardLabel.pack(expand=True, fill="both", padx=10, pady=10)
+        timingsLabel = tk.Label(metaevalFrame, text="", font="TkFixedFont", justify="left", anchor="nw")
+        timingsLabel.pack(expand=True, fill="both", padx=10, pady=10)
         #TODO
 
         root.bind("<m>", lambda event: self.switch_mode())
-        root.bind("<Shift_L>", lambda event: self.record.save())
+        root.bind("<p>", lambda event: self.toggle_profiler())
+        root.bind("<Shift_L>", lambda event: self.record.flush())
         root.bind("<q>", lambda event: self.quit())
+        root.protocol("WM_DELETE_WINDOW", self.quit)
 
         self.root = root
         self.compairFrame = compairFrame
         self.metaevalFrame = metaevalFrame
+        self.leaderboardLabel = leaderboardLabel
+        self.timingsLabel = timingsLabel
+        self.timings_after = None
         imgDisplayL._image_ref_origin = None
+        imgDisplayL._image_ref_id = None
         imgDisplayL._image_ref_tk = None
+        imgDisplayL._settle_after = None
+        imgDisplayL._feature_items = {}
+        imgDisplayL._image_ref_tk_features = {}
         imgDisplayR._image_ref_origin = None
+        imgDisplayR._image_ref_id = None
         imgDisplayR._image_ref_tk = None
+        imgDisplayR._settle_after = None
+        imgDisplayR._feature_items = {}
+        imgDisplayR._image_ref_tk_features = {}
         self.imgDisplayL = imgDisplayL
         self.imgDisplayR = imgDisplayR
         self.imgIdxLabelL = imgIdxLabelL
@@ -268,6 +2593,50 @@ class App:
         self.compairResult = {}
         self.overlay = True
         self.switch_mode("compair")
+        if manifest and rescan_interval > 0:
+            root.after(int(rescan_interval * 1000), self.rescan)
+
+    def load_image(self, pic_id, max_size):
+        path = f"{self.pics_base}/{self.pics[pic_id]}"
+        if not self.previews:
+            return load_display_image(path, max_size)
+        # missing previews get written through, so the next session finds them
+        image = self.previews.get(path)
+        if image.width > max_size[0] or image.height > max_size[1]:
+            image.thumbnail(max_size, Image.LANCZOS)
+        return image
+
+    def rescan(self):
+        self.scanning = self.scanner.submit(self.manifest.scan)
+        self.root.after(50, self.rescan_done)
+
+    def rescan_done(self):
+        # the ui thread only polls the scan, and applies what it found
+        if not self.scanning.done():
+            self.root.after(50, self.rescan_done)
+            return
+        pics = self.scanning.result()
+        self.scanning = None
+        self.add_new_pics(pics)
+        # nothing was left to compare, the new pictures may change that
+        if not self.idxL:
+            self.new_compair()
+        self.root.after(int(self.rescan_interval * 1000), self.rescan)
+
+    def add_new_pics(self, pics):
+        if self.manifest.generation == self.manifest_generation:
+            return
+        self.manifest_generation = self.manifest.generation
+        new_pics = [(num, filename) for num, filename in pics if num not in self.pics]
+        if len(new_pics) > 0:
+            self.pics.update(new_pics)
+            self.record.add_pics(new_pics)
+            print(f"added {len(set(num for num, _ in new_pics))} new pictures")
+
+    def know_pics(self, pic_ids):
+        # a record server may have found new pictures before this app did, they are needed right away
+        if self.manifest and any(pic_id not in self.pics for pic_id in pic_ids):
+            self.add_new_pics(self.manifest.scan())
 
     def update_title(self, root=None):
         if not root:
@@ -276,13 +2645,22 @@ class App:
 
     def quit(self):
         #TODO move this into proper panel
-        for feature in self.record.statistics:
+        judged_features = self.record.judged_features()
+        for feature in judged_features:
             print(f"feature toplist: {feature}")
-            for tlentry in self.record.calculate_feature_toplist(feature)[:10]:
+            for tlentry in self.record.calculate_feature_toplist(feature, k=10):
                 print(f"\t[{tlentry[0]}] ({tlentry[1]*100 :.2f}% ~ {tlentry[2]*100 :.2f}%)")
         print(f"general toplist:")
-        for tlentry in self.record.calculate_feature_toplist(list(self.record.statistics.keys()))[:10]:
+        for tlentry in self.record.calculate_feature_toplist(judged_features, k=10):
             print(f"\t[{tlentry[0]}] ({tlentry[1]*100 :.2f}% ~ {tlentry[2]*100 :.2f}%)")
+        # flushes the journal, including decisions on a pair that was not finished
+        self.record.close()
+        self.prefetcher.shutdown()
+        if self.scanner:
+            self.scanner.shutdown(wait=False, cancel_futures=True)
+        if self.profile_path:
+            profiler.export(self.profile_path, self.profile_format)
+            print(f"profile written to {self.profile_path}")
         exit()
 
     def switch_mode(self, target_mode=None):
@@ -301,10 +2679,57 @@ class App:
             self.compairFrame.forget()
             self.metaevalFrame.pack(expand=True, fill="both")
             self.metaevalFrame.focus()
+            self.update_leaderboard()
+            self.update_timings()
         else:
             print("ERROR: unknown mode")
             exit()
 
+    def update_leaderboard(self):
+        # toplists are maintained incrementally, so this is cheap enough to call after every decision
+        lines = []
+        for features in [[feature] for feature in self.features] + ([self.features] if len(self.features) > 1 else []):
+            lines += [f"toplist: {", ".join(features)}"]
+            for tlentry in self.record.calculate_feature_toplist(features, k=10):
+                lines += [f"  [{tlentry[0]}] ({tlentry[1]*100 :.2f}% ~ {tlentry[2]*100 :.2f}%)"]
+            lines += [""]
+        for feature, merges, waiting, order in self.record.sort_progress(self.features):
+            if order is not None:
+                lines += [f"sort: {feature}: done, best first: {", ".join([str(idx) for idx in order[:10]])}"]
+            else:
+                lines += [f"sort: {feature}: {merges} merges left, {waiting} waiting for a judgment"]
+            lines += [""]
+        contradictions = self.record.contradictions()
+        if len(contradictions) > 0:
+            lines += [f"contradictions: {len(contradictions)}"]
+            for feature, cycle in contradictions[-10:]:
+                lines += [f"  {feature}: {" > ".join([str(idx) for idx in cycle])}"]
+            lines += [""]
+        self.leaderboardLabel.config(text="\n".join(lines))
+
+    def update_timings(self):
+        if self.timings_after:
+            self.root.after_cancel(self.timings_after)
+            self.timings_after = None
+        if self.mode != "meta-eval":
+            return
+        if not profiler.enabled:
+            self.timingsLabel.config(text="timings: off, press <p> to start")
+            return
+        lines = [f"timings: last {profiler.window} per stage, in ms, <p> to stop", f"  {"stage" :<20}{"count" :>8}{"p50" :>9}{"p90" :>9}{"p99" :>9}{"max" :>9}"]
+        for stage, stats in sorted(profiler.summary().items()):
+            lines += [f"  {stage :<20}{stats["count"] :>8}" + "".join([f"{stats[name]*1e3 :>9.2f}" for name in ["p50", "p90", "p99", "max"]])]
+        self.timingsLabel.config(text="\n".join(lines))
+        # refreshed while the panel is shown
+        self.timings_after = self.root.after(1000, self.update_timings)
+
+    def toggle_profiler(self):
+        if profiler.enabled:
+            profiler.stop()
+        else:
+            profiler.start()
+        self.update_timings()
+
     def toggle_overlay(self):
         if self.idxL and self.idxR:
             self.overlay = not self.overlay
@@ -321,88 +2746,141 @@ class App:
         # drop ref and img
         imgDisplay._image_ref_tk = None
         imgDisplay.delete("IMG")
+        # a pending high quality pass is superseded by this one
+        if imgDisplay._settle_after:
+            self.root.after_cancel(imgDisplay._settle_after)
+            imgDisplay._settle_after = None
         # resizing only if image set
         if imgDisplay._image_ref_origin:
-            # copy original for modification
-            image = imgDisplay._image_ref_origin.copy()
+            image = imgDisplay._image_ref_origin
             # calc the scaling we need to make it fit
             scale_width = elem_width / image.width
             scale_height = elem_height / image.height
             scale = min(scale_width, scale_height)
-            # calc new with from scaling and resize
-            new_width = int(image.width * scale)
-            new_height = int(image.height * scale)
-            image = image.resize((new_width, new_height), Image.LANCZOS)
+            # snap the width to the rendition bucket, so small size changes hit the cache
+            if image.width * scale >= self.rendition_bucket:
+                scale = (int(image.width * scale) // self.rendition_bucket * self.rendition_bucket) / image.width
+            # calc new with from scaling
+            new_width = max(1, int(image.width * scale))
+            new_height = max(1, int(image.height * scale))
+            key = (imgDisplay._image_ref_id, new_width, new_height)
+            tk_image = self.renditions.get(key)
+            if tk_image is None and event:
+                # cheap pass while the window is being dragged, the high quality one follows once it settles
+                with profiler.span("resize_draft"):
+                    tk_image = ImageTk.PhotoImage(image.resize((new_width, new_height), Image.NEAREST))
+                imgDisplay._settle_after = self.root.after(self.settle_delay, lambda: self.settle_image(imgDisplay))
+            elif tk_image is None:
+                with profiler.span("resize"):
+                    tk_image = ImageTk.PhotoImage(image.resize((new_width, new_height), Image.LANCZOS))
+                self.renditions.put(key, tk_image, new_width * new_height * 4)
             # set image to canvas
-            tk_image = ImageTk.PhotoImage(image)
             imgDisplay._image_ref_tk = tk_image
             imgDisplay.create_image(elem_width / 2, elem_height / 2, image=tk_image, anchor="center", tags="IMG")
         self.update_compair_features()
 
+    def settle_image(self, imgDisplay):
+        imgDisplay._settle_after = None
+        self.resize_and_set_image(imgDisplay, None)
+
     def update_compair_features(self):
+        with profiler.span("overlay"):
+            self.render_compair_features()
+
+    def render_compair_features(self):
         for highlightFrame in [self.imgFeatureHighlightContainerL, self.imgFeatureHighlightContainerR]:
             for i, highlight in enumerate(highlightFrame.highlights):
-                if i < len(self.current_features):
-                    highlight.pack(anchor="n", expand=True, fill="both")
-                else:
-                    highlight.forget()
-                if i == self.featureIdx and self.overlay:
-                    highlight.config(bg="blueviolet")
-                else:
-                    highlight.config(bg="lightyellow")
+                # only touch the widgets whose state changed, repacking forces a new layout pass
+                shown = i < len(self.current_features)
+                if shown != highlight._shown:
+                    if shown:
+                        highlight.pack(anchor="n", expand=True, fill="both")
+                    else:
+                        highlight.forget()
+                    highlight._shown = shown
+                bg = "blueviolet" if i == self.featureIdx and self.overlay else "lightyellow"
+                if bg != highlight._bg:
+                    highlight.config(bg=bg)
+                    highlight._bg = bg
 
         for imgDisplay, whichDisplay in [(self.imgDisplayL, "left"), (self.imgDisplayR, "right")]:
-            imgDisplay.delete("FEATURE")
-            imgDisplay._image_ref_tk_features = []
-            if not self.overlay or len(self.features) < 2 or len(self.current_features) == 0:
-                continue
+            # wanted strips by index, as (cache key, y position)
+            strips = {}
             elem_width = imgDisplay.winfo_width()
             elem_height = imgDisplay.winfo_height()
-            if elem_width < 10 or elem_height < 10:
-                continue
-            perFeatureHeight = elem_height // len(self.current_features)
-            for i in range(len(self.current_features)):
-                if i > self.featureIdx:
-                    continue
-                decided = i < self.featureIdx and self.compairResult[self.current_features[i]] in ["both", whichDisplay]
-                if not decided and i < self.featureIdx:
+            if self.overlay and len(self.features) >= 2 and len(self.current_features) > 0 and elem_width >= 10 and elem_height >= 10:
+                perFeatureHeight = elem_height // len(self.current_features)
+                for i in range(len(self.current_features)):
+                    if i > self.featureIdx:
+                        continue
+                    decided = i < self.featureIdx and self.compairResult[self.current_features[i]] in ["both", whichDisplay]
+                    if not decided and i < self.featureIdx:
+                        continue
+                    last = i == len(self.current_features) - 1
+                    strips[i] = ((f"{self.current_features[i]}", elem_width, perFeatureHeight, decided, last), perFeatureHeight * i)
+            # drop, restyle or create canvas items, strips that did not change stay as they are
+            for i in [i for i in imgDisplay._feature_items if i not in strips]:
+                item, _, _ = imgDisplay._feature_items.pop(i)
+                imgDisplay.delete(item)
+            for i, (key, y) in strips.items():
+                current = imgDisplay._feature_items.get(i)
+                if current and current[1] == key and current[2] == y:
                     continue
-                featureImg = Image.new("RGBA", (elem_width, perFeatureHeight + (1 if i == len(self.current_features) - 1 else 0)), (0, 0, 0, 50) if not decided else (0, 0, 0, 0))
-                featureDraw = ImageDraw.Draw(featureImg)
-                featureFontSize = perFeatureHeight * 0.8
-                featureFont = ImageFont.load_default(featureFontSize)
-                featureStr = f"{self.current_features[i]}"
-                #TODO looks very good with all caps feature names, but we could also measure the str and center it manually (unreasonable effort though)
-                text_width, text_height = PILmeasureText(featureStr, featureFont)
-                horizontal_fill_ratio = 0.9
-                if text_width > elem_width * horizontal_fill_ratio:
-                    featureFontSize = featureFontSize * ((elem_width * horizontal_fill_ratio) / text_width)
-                    featureFont = ImageFont.load_default(featureFontSize)
-                featureDraw.text((elem_width/2, perFeatureHeight/2), featureStr, anchor="mm", fill=(255, 255, 255, 50), stroke_width=3, stroke_fill=(0, 0, 0, 100) if not decided else (0, 0, 0, 50), font=featureFont)
-                featureImgTk = ImageTk.PhotoImage(featureImg)
-                imgDisplay._image_ref_tk_features += [featureImgTk]
-                imgDisplay.create_image(0, perFeatureHeight * i, image=featureImgTk, anchor="nw", tags="FEATURE")
+                featureImgTk = self.overlay_strips.get(key)
+                if featureImgTk is None:
+                    featureImgTk = ImageTk.PhotoImage(render_feature_strip(*key))
+                    self.overlay_strips.put(key, featureImgTk, key[1] * key[2] * 4)
+                if current:
+                    imgDisplay.itemconfig(current[0], image=featureImgTk)
+                    imgDisplay.coords(current[0], 0, y)
+                    item = current[0]
+                else:
+                    item = imgDisplay.create_image(0, y, image=featureImgTk, anchor="nw", tags="FEATURE")
+                imgDisplay._feature_items[i] = (item, key, y)
+                # shown strips stay referenced even if the cache evicts them
+                imgDisplay._image_ref_tk_features[i] = featureImgTk
+            for i in [i for i in imgDisplay._image_ref_tk_features if i not in strips]:
+                del imgDisplay._image_ref_tk_features[i]
+            # strips are drawn above the picture, which gets recreated on resize
+            imgDisplay.tag_raise("FEATURE")
 
     def new_compair(self):
         # pick new idcs for compair
-        self.idxL, self.idxR, self.current_features = self.record.get_new_compair(self.features)
+        with profiler.span("get_new_compair"):
+            self.idxL, self.idxR, self.current_features = self.record.get_new_compair(self.features)
         if self.idxL and self.idxR:
+            self.know_pics([self.idxL, self.idxR])
             # set label for img stats
             self.imgIdxLabelL.config(text=f"{self.idxL}")
             self.imgIdxLabelR.config(text=f"{self.idxR}")
-            # load and set images
-            self.imgDisplayL._image_ref_origin = Image.open(f"{self.pics_base}/{self.pics[self.idxL]}")
-            self.imgDisplayR._image_ref_origin = Image.open(f"{self.pics_base}/{self.pics[self.idxR]}")
+            # set images, decoded ahead of time by the prefetcher if they were upcoming
+            # the wait is what is left of the decode once prefetching fell behind
+            with profiler.span("image_wait"):
+                self.imgDisplayL._image_ref_origin = self.prefetcher.get(self.idxL)
+                self.imgDisplayR._image_ref_origin = self.prefetcher.get(self.idxR)
+            self.imgDisplayL._image_ref_id = self.idxL
+            self.imgDisplayR._image_ref_id = self.idxR
         else:
             # reset label
             self.imgIdxLabelL.config(text="-")
             self.imgIdxLabelR.config(text="-")
             # drop images1
             self.imgDisplayL._image_ref_origin = None
+            self.imgDisplayL._image_ref_id = None
             self.imgDisplayR._image_ref_origin = None
+            self.imgDisplayR._image_ref_id = None
         # force redraw
         self.resize_and_set_image(self.imgDisplayL, None)
         self.resize_and_set_image(self.imgDisplayR, None)
+        self.prefetch_upcoming()
+
+    def prefetch_upcoming(self):
+        with profiler.span("peek_compairs"):
+            upcoming = self.record.peek_compairs(self.features, self.prefetch)
+        wanted = [idx for cpair in upcoming for idx in cpair]
+        self.know_pics(wanted)
+        self.prefetcher.retain(set(wanted + [self.idxL, self.idxR]))
+        self.prefetcher.request(wanted)
 
     def next_feature_or_compair(self, skip=False):
         if not skip:
@@ -413,7 +2891,8 @@ class App:
             self.compairResult = {}
             self.featureIdx = 0
             self.new_compair()
-            self.record.save()
+            with profiler.span("save"):
+                self.record.save()
         else:
             self.update_compair_features()
 
@@ -423,38 +2902,419 @@ class App:
     def compair_none(self):
         if self.idxL and self.idxR and self.overlay:
             self.compairResult[self.current_features[self.featureIdx]] = "none"
-            self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "none")
+            with profiler.span("add_compair_result"):
+                self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "none")
             self.next_feature_or_compair()
 
     def compair_left(self):
         if self.idxL and self.idxR and self.overlay:
             self.compairResult[self.current_features[self.featureIdx]] = "left"
-            self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "left")
+            with profiler.span("add_compair_result"):
+                self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "left")
             self.next_feature_or_compair()
 
     def compair_right(self):
         if self.idxL and self.idxR and self.overlay:
             self.compairResult[self.current_features[self.featureIdx]] = "right"
-            self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "right")
+            with profiler.span("add_compair_result"):
+                self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "right")
             self.next_feature_or_compair()
 
     def compair_both(self):
         if self.idxL and self.idxR and self.overlay:
             self.compairResult[self.current_features[self.featureIdx]] = "both"
-            self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "both")
+            with profiler.span("add_compair_result"):
+                self.record.add_compair_result((self.idxL, self.idxR), self.current_features[self.featureIdx], "both")
             self.next_feature_or_compair()
 
 
-def get_number_files_list(target_dir):
+class PictureManifest:
+
+    # numbered pictures below a directory, nested directories included, along with the mtime of every directory
+    # a rescan only lists directories whose mtime changed, all others are taken from the manifest
+    root: str
+    path: str
+    directories: dict
+    generation: int
+    lock: threading.Lock
+
     # match files named with a number, ignoring extension
     pattern = re.compile(r"^(\d+)")
 
-    # scan directory and extract numbers from file names
-    numbers_and_filenames = []
-    for filename in os.listdir(target_dir):
-        match = pattern.match(filename)
-        if match:
-            numbers_and_filenames.append((int(match.group(1)), filename))
+    def __init__(self, root, path=None):
+        self.root = root
+        self.path = path
+        # relative directory -> [mtime, [[number, relative path], ..], [relative subdirectory, ..]]
+        self.directories = {}
+        # counts scans which found changes
+        self.generation = 0
+        # the app scans on a worker thread, and on its own when a record server knows pictures first
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path:
+            return
+        if not os.path.exists(self.path):
+            # created before any directory mtime is taken, the first save would change the mtime of its directory
+            try:
+                open(self.path, "a").close()
+            except OSError:
+                pass
+            return
+        try:
+            with open(self.path) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            # a torn manifest only costs a full scan
+            return
+        if manifest.get("root") == self.root:
+            self.directories = manifest["directories"]
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            # rewritten in place, creating a new file would change the mtime of the picture directory
+            with open(self.path, "w") as file:
+                json.dump({"root": self.root, "directories": self.directories}, file)
+        except OSError:
+            pass
+
+    def list_directory(self, relative, mtime):
+        files = []
+        subdirs = []
+        with os.scandir(os.path.join(self.root, relative)) as iterator:
+            for entry in iterator:
+                # hidden entries hold the preview store and the manifest itself
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(os.path.join(relative, entry.name))
+                elif entry.is_file():
+                    match = self.pattern.match(entry.name)
+                    if match:
+                        files.append([int(match.group(1)), os.path.join(relative, entry.name)])
+        # a directory changed within the last seconds could change again within the same mtime tick
+        if time.time_ns() - mtime < 2 * 10**9:
+            mtime = None
+        return [mtime, files, subdirs]
+
+    def scan(self):
+        with self.lock:
+            return self.scan_locked()
+
+    def scan_locked(self):
+        # returns (number, path relative to the root) of every picture, and saves the manifest if anything changed
+        directories = {}
+        changed = False
+        pending = [""]
+        while len(pending) > 0:
+            relative = pending.pop()
+            try:
+                mtime = os.stat(os.path.join(self.root, relative)).st_mtime_ns
+                cached = self.directories.get(relative)
+                if cached and cached[0] == mtime:
+                    directories[relative] = cached
+                else:
+                    directories[relative] = self.list_directory(relative, mtime)
+                    changed = True
+            except OSError:
+                # removed while scanning
+                continue
+            pending += directories[relative][2]
+        if changed or directories.keys() != self.directories.keys():
+            self.directories = directories
+            self.generation += 1
+            self.save()
+        return [(number, path) for _, files, _ in directories.values() for number, path in files]
+
+
+def difference_hash(path, size=8):
+    # 64 bit difference hash, brightness steps between neighbouring pixels of a tiny grayscale copy
+    try:
+        with Image.open(path) as image:
+            # jpegs decode at a fraction of their size
+            image.draft("L", (size * 4, size * 4))
+            pixels = image.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    except OSError:
+        return None
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            value = value << 1 | (pixels[row * (size + 1) + col] < pixels[row * (size + 1) + col + 1])
+    return value
+
+
+class HashIndex:
+
+    # multi-index hashing over 64 bit hashes split into 16 bit chunks: two hashes within the radius
+    # differ in at most radius // 4 bits in one of their chunks, so candidates come from looking up
+    # every chunk with up to that many bits flipped, and only those get their full distance checked
+    chunks = 4
+    values: list
+    items: list
+    tables: list
+    tabled: int
+    masks: dict
+
+    def __init__(self):
+        self.values = []
+        self.items = []
+        # per chunk, chunk value -> [(hash, item), ..], filled on the first single search only
+        self.tables = [{} for _ in range(self.chunks)]
+        self.tabled = 0
+        self.masks = {}
+
+    def chunk_masks(self, flips):
+        # every 16 bit mask with at most flips bits set
+        if flips not in self.masks:
+            masks = {0}
+            for _ in range(flips):
+                masks |= {mask | 1 << bit for mask in masks for bit in range(16)}
+            self.masks[flips] = list(masks)
+        return self.masks[flips]
+
+    def add(self, value, item):
+        self.values.append(value)
+        self.items.append(item)
+
+    def search(self, value, radius):
+        for value_item in zip(self.values[self.tabled:], self.items[self.tabled:]):
+            for chunk, table in enumerate(self.tables):
+                key = value_item[0] >> (16 * chunk) & 0xffff
+                if key not in table:
+                    table[key] = []
+                table[key].append(value_item)
+        self.tabled = len(self.values)
+        found = set()
+        masks = self.chunk_masks(radius // self.chunks)
+        for chunk, table in enumerate(self.tables):
+            key = value >> (16 * chunk) & 0xffff
+            for mask in masks:
+                for other, item in table.get(key ^ mask, ()):
+                    if (other ^ value).bit_count() <= radius:
+                        found.add(item)
+        return list(found)
+
+    def near_pairs(self, hashes, radius):
+        # unordered pairs of distinct items within the radius, one of them given and the other indexed
+        if np is None or len(hashes) < 256:
+            return list(set([(min(item, other), max(item, other)) for item, value in hashes.items() for other in self.search(value, radius) if other != item]))
+        # all lookups of one chunk and mask at once, the indexed hashes bucketed by chunk value
+        values = np.array(self.values, dtype=np.uint64)
+        items = np.array(self.items, dtype=np.int64)
+        query = np.array(list(hashes.values()), dtype=np.uint64)
+        query_items = np.array(list(hashes.keys()), dtype=np.int64)
+        found = []
+        for chunk in range(self.chunks):
+            keys = ((values >> np.uint64(16 * chunk)) & np.uint64(0xffff)).astype(np.int64)
+            order = np.argsort(keys, kind="stable")
+            bucket_size = np.bincount(keys, minlength=1 << 16)
+            bucket_start = np.cumsum(bucket_size) - bucket_size
+            query_keys = ((query >> np.uint64(16 * chunk)) & np.uint64(0xffff)).astype(np.int64)
+            masks = np.array(self.chunk_masks(radius // self.chunks), dtype=np.int64)
+            # blocks of masks, so the temporaries stay around a million entries
+            block = max(1, (1 << 20) // len(query))
+            for first in range(0, len(masks), block):
+                target = (masks[first:first + block, None] ^ query_keys[None, :]).ravel()
+                counts = bucket_size[target]
+                hit = np.flatnonzero(counts)
+                source = hit % len(query)
+                start = bucket_start[target[hit]]
+                counts = counts[hit]
+                # buckets hold few hashes, so they are walked one depth at a time
+                depth = 0
+                while len(source) > 0:
+                    candidate = order[start + depth]
+                    near = popcount64(query[source] ^ values[candidate]) <= radius
+                    item, other = query_items[source[near]], items[candidate[near]]
+                    # as one code, lower item in the high bits
+                    found.append(np.minimum(item, other) << 32 | np.maximum(item, other))
+                    depth += 1
+                    deeper = counts > depth
+                    source, start, counts = source[deeper], start[deeper], counts[deeper]
+        if len(found) == 0:
+            return []
+        # a pair shows up once for every chunk within reach, and from both sides
+        codes = np.unique(np.concatenate(found))
+        codes = codes[codes >> 32 != codes & 0xffffffff]
+        return list(zip((codes >> 32).tolist(), (codes & 0xffffffff).tolist()))
+
+
+def popcount64(values):
+    # set bits of every uint64
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class PictureClusters:
+
+    # near-duplicate pictures grouped by difference hash, only one representative per cluster gets compared
+    # hashes are cached by path, mtime and size, the first grouping by a digest of all hashes;
+    # pictures found while running join clusters, but clusters never merge, as that would turn a compared representative into a member
+    root: str
+    path: str
+    distance: int
+    cached: dict
+    hashes: dict
+    groups: dict
+    changed: bool
+    index: HashIndex
+    representative: dict
+    members: dict
+
+    def __init__(self, root, distance, path=None):
+        self.root = root
+        self.distance = distance
+        self.path = path
+        # relative path -> [mtime, size, hash], hash is None for unreadable pictures
+        self.cached = {}
+        self.hashes = {}
+        # digest of the first grouping, and its clusters
+        self.groups = {}
+        self.changed = False
+        self.index = HashIndex()
+        # picture id -> representative id, and representative id -> member ids, representative first
+        self.representative = {}
+        self.members = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return
+        if cache.get("root") == self.root:
+            self.cached = cache["hashes"]
+            self.groups = cache.get("groups", {})
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            # rewritten in place like the manifest, so the picture directory keeps its mtime
+            with open(self.path, "w") as file:
+                json.dump({"root": self.root, "hashes": self.hashes, "groups": self.groups}, file)
+        except OSError:
+            pass
+
+    def hash_pictures(self, pics):
+        # picture id -> hash, uncached pictures get hashed using all cores
+        keys = {}
+        missing = []
+        for idx, relpath in pics:
+            try:
+                stat = os.stat(os.path.join(self.root, relpath))
+                keys[relpath] = [stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                keys[relpath] = [None, None]
+            cached = self.cached.get(relpath)
+            if cached and cached[:2] == keys[relpath]:
+                self.hashes[relpath] = cached
+            else:
+                missing.append(relpath)
+        paths = [os.path.join(self.root, relpath) for relpath in missing]
+        if len(paths) > 16:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                values = list(executor.map(difference_hash, paths, chunksize=16))
+        else:
+            values = [difference_hash(path) for path in paths]
+        for relpath, value in zip(missing, values):
+            self.hashes[relpath] = keys[relpath] + [value]
+        self.changed |= len(missing) > 0
+        return dict([(idx, self.hashes[relpath][2]) for idx, relpath in pics])
+
+    def add(self, pics):
+        # returns the new pictures which represent a cluster, the others become members of one
+        new_pics = dict()
+        for idx, relpath in pics:
+            if idx not in self.representative and idx not in new_pics:
+                new_pics[idx] = relpath
+        if len(new_pics) == 0:
+            return []
+        hashes = self.hash_pictures(list(new_pics.items()))
+        if len(self.members) == 0:
+            digest = hashlib.sha1(json.dumps([self.distance, sorted(hashes.items())]).encode()).hexdigest()
+            if self.groups.get("digest") == digest:
+                self.restore(hashes, self.groups["members"])
+            else:
+                self.group(hashes)
+                self.groups = {"digest": digest, "members": list(self.members.values())}
+                self.changed = True
+        else:
+            self.group(hashes)
+        if self.changed:
+            self.save()
+            self.changed = False
+        return [(idx, relpath) for idx, relpath in new_pics.items() if self.representative[idx] == idx]
+
+    def group(self, hashes):
+        # union-find over the new pictures and the existing representatives, which always stay roots
+        parent = {}
+        def find(idx):
+            parent.setdefault(idx, idx)
+            while parent[idx] != idx:
+                parent[idx] = parent[parent[idx]]
+                idx = parent[idx]
+            return idx
+        def union(idxA, idxB):
+            rootA, rootB = find(idxA), find(idxB)
+            existingA, existingB = rootA in self.members, rootB in self.members
+            if rootA == rootB or (existingA and existingB):
+                return
+            if existingB or (not existingA and rootB < rootA):
+                rootA, rootB = rootB, rootA
+            parent[rootB] = rootA
+        hashed = dict([(idx, value) for idx, value in hashes.items() if value is not None])
+        for idx, value in hashed.items():
+            self.index.add(value, idx)
+        # pairs come unordered, either side may be a known picture which stands for its representative
+        for idx, other in self.index.near_pairs(hashed, self.distance):
+            union(self.representative.get(idx, idx), self.representative.get(other, other))
+        for idx in sorted(hashes):
+            root = find(idx)
+            self.representative[idx] = root
+            if root == idx:
+                self.members[idx] = [idx]
+        for idx in sorted(hashes):
+            if self.representative[idx] != idx:
+                self.members[self.representative[idx]].append(idx)
+
+    def restore(self, hashes, groups):
+        for members in groups:
+            self.members[members[0]] = members
+            for idx in members:
+                self.representative[idx] = members[0]
+        for idx, value in hashes.items():
+            if value is not None:
+                self.index.add(value, idx)
+
+    def spread(self, toplist):
+        # members take the place and the scores of their representative
+        return [(member, *scores) for idx, *scores in toplist for member in self.members.get(idx, [idx])]
+
+
+def format_ranges(numbers):
+    # sorted numbers as "1-4, 7, 9-12"
+    ranges = []
+    for number in numbers:
+        if len(ranges) > 0 and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges += [[number, number]]
+    return ", ".join([f"{low}-{high}" if low != high else f"{low}" for low, high in ranges])
+
+
+def get_number_files_list(target_dir, manifest=None):
+    # scan directory tree and extract numbers from file names, unchanged directories come from the manifest
+    if manifest is None:
+        manifest = PictureManifest(target_dir)
+    numbers_and_filenames = manifest.scan()
 
     # sort numbers
     sorted_numbers_and_filenames = sorted(numbers_and_filenames, key=lambda x: x[0])
@@ -467,33 +3327,239 @@ def get_number_files_list(target_dir):
     if duplicates:
         print(f"WARN: duplicates: {duplicates}")
 
-    # find missing numbers
-    discontinuities = [x for x in range(min(sorted_numbers), max(sorted_numbers)) if x not in sorted_numbers]
+    # find missing numbers, against a set so this stays linear
+    present = set(sorted_numbers)
+    discontinuities = [x for x in range(min(sorted_numbers), max(sorted_numbers)) if x not in present] if sorted_numbers else []
     if discontinuities:
-        print(f"WARN: missing numbers: {discontinuities}")
+        print(f"WARN: missing numbers: {format_ranges(discontinuities)}")
     
     return sorted_numbers_and_filenames
 
 
+def rank_feature(pic_ids, feature, entries, scorer, sortby):
+    # runs in a worker process, ranks one feature over an in-memory record
+    record = Record([(idx, None) for idx in pic_ids], None, "random", scorer)
+    record.entries = entries
+    record.replay(0)
+    return record.calculate_feature_toplist(feature, sortby)
+
+
+def rank_records(record_paths, pic_ids, features, scorer, sortby, jobs):
+    # streams and merges the logs, then ranks every feature in parallel, returns per feature and combined toplists
+    entries = RecordEntries()
+    for path in record_paths:
+        open_record_file(path).read_into(entries)
+    if pic_ids is None:
+        pic_ids = entries.pic_ids()
+    if not features:
+        features = list(entries.features)
+    arguments = [(pic_ids, feature, entries.select(feature), scorer, sortby) for feature in features]
+    if jobs > 1 and len(features) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(features))) as executor:
+            toplists = list(executor.map(rank_feature, *zip(*arguments)))
+    else:
+        toplists = [rank_feature(*argument) for argument in arguments]
+    # same accumulation as calculate_feature_toplist over all features at once
+    combined = dict([(idx, [0, 0]) for idx in pic_ids])
+    for toplist in toplists:
+        for idx, score, certainty in toplist:
+            combined[idx][0] += score * (1 / len(features))
+            combined[idx][1] += certainty * (1 / len(features))
+    combined = [(idx, score, certainty) for idx, (score, certainty) in combined.items()]
+    combined.sort(key=lambda x: (x[2] if sortby == "confidence" else x[1], x[0]), reverse=True)
+    return (dict(zip(features, toplists)), combined)
+
+
+def write_rankings(file, output_format, features, toplists, combined, scorer, sortby):
+    if output_format == "json":
+        def rows(toplist):
+            return [{"rank": rank + 1, "id": idx, "score": score, "certainty": certainty} for rank, (idx, score, certainty) in enumerate(toplist)]
+        json.dump({
+            "scorer": scorer,
+            "sortby": sortby,
+            "features": dict([(feature, rows(toplist)) for feature, toplist in toplists.items()]),
+            "combined": rows(combined),
+        }, file, indent=1)
+        file.write("\n")
+        return
+    writer = csv.writer(file)
+    writer.writerow(["toplist", "feature", "rank", "id", "score", "certainty"])
+    for feature, toplist in toplists.items():
+        for rank, (idx, score, certainty) in enumerate(toplist):
+            writer.writerow(["feature", feature, rank + 1, idx, score, certainty])
+    for rank, (idx, score, certainty) in enumerate(combined):
+        writer.writerow(["combined", "+".join(features), rank + 1, idx, score, certainty])
+
+
+def main_rank(argv):
+    parser = argparse.ArgumentParser(prog="isatara.py rank", description="merge comparison logs and write full rankings, without a display")
+    parser.add_argument("--record", required=True, action="append", metavar="RECORD", help="record file to merge, can be given multiple times")
+    parser.add_argument("--features", required=False, metavar="FEATURES", help="comma-separated list of features to rank, defaults to all features in the records")
+    parser.add_argument("--pictures", required=False, metavar="PATH", help="picture directory, defaults to all pictures seen in the records")
+    parser.add_argument("--scorer", required=False, choices=["winratio", "bradleyterry", "elo", "pagerank"], default="winratio", metavar="SCORER", help="scoring model, can be one of: winratio, bradleyterry, elo, pagerank")
+    parser.add_argument("--sortby", required=False, choices=["favor", "confidence"], default="favor", metavar="SORTBY", help="toplist order, can be one of: favor, confidence")
+    parser.add_argument("--output", required=False, metavar="PATH", help="output file, defaults to stdout")
+    parser.add_argument("--format", required=False, choices=["csv", "json"], metavar="FORMAT", help="output format, defaults to the output file extension or csv: csv, json")
+    parser.add_argument("--jobs", required=False, type=int, default=os.cpu_count() or 1, metavar="JOBS", help="number of worker processes")
+    parser.add_argument("--dedupe", required=False, type=int, default=0, metavar="DISTANCE", help="group pictures whose difference hashes differ in at most this many of 64 bits, and only compare one picture per group, 0 disables")
+    args = parser.parse_args(argv)
+
+    if args.scorer != "winratio" and np is None:
+        print(f"ERROR: the {args.scorer} scorer requires numpy")
+        exit()
+    for path in args.record:
+        if not os.path.exists(path):
+            print(f"ERROR: record does not exist: {path}")
+            exit()
+    if args.dedupe > 0 and not args.pictures:
+        print("ERROR: --dedupe requires --pictures")
+        exit()
+    pic_ids = None
+    clusters = None
+    if args.pictures:
+        pics_base = os.path.abspath(args.pictures)
+        pics = get_number_files_list(pics_base)
+        if args.dedupe > 0:
+            clusters = PictureClusters(pics_base, args.dedupe, os.path.join(pics_base, ".isatara-hashes"))
+            pics = clusters.add(pics)
+        pic_ids = [num for num, _ in pics]
+    features = args.features.split(",") if args.features else []
+    output_format = args.format
+    if not output_format:
+        output_format = "json" if args.output and args.output.endswith(".json") else "csv"
+
+    toplists, combined = rank_records(args.record, pic_ids, features, args.scorer, args.sortby, args.jobs)
+    if clusters:
+        toplists = dict([(feature, clusters.spread(toplist)) for feature, toplist in toplists.items()])
+        combined = clusters.spread(combined)
+    if args.output:
+        with open(args.output, "w", newline="") as file:
+            write_rankings(file, output_format, list(toplists.keys()), toplists, combined, args.scorer, args.sortby)
+    else:
+        write_rankings(sys.stdout, output_format, list(toplists.keys()), toplists, combined, args.scorer, args.sortby)
+
+
+def main_serve(argv):
+    parser = argparse.ArgumentParser(prog="isatara.py serve", description="share one record between several raters on the network")
+    parser.add_argument("--pictures", required=True, metavar="PATH", help="path to picture directory")
+    parser.add_argument("--record", required=True, metavar="RECORD", help="record file for comparison log")
+    parser.add_argument("--compair-mode", required=False, choices=["random", "refine", "explore", "smart", "sort"], default="random", metavar="COMPAIR_MODE", help="strategy for offering compairs, can be one of: random, refine, explore, smart, sort")
+    parser.add_argument("--scorer", required=False, choices=["winratio", "bradleyterry", "elo", "pagerank"], default="winratio", metavar="SCORER", help="scoring model for toplists, can be one of: winratio, bradleyterry, elo, pagerank")
+    parser.add_argument("--record-format", required=False, choices=["text", "binary"], default="text", metavar="FORMAT", help="format for a new record file, existing ones keep theirs: text, binary")
+    parser.add_argument("--fsync", required=False, choices=["batch", "never"], default="batch", metavar="FSYNC", help="whether the record gets fsynced after each written batch: batch, never")
+    parser.add_argument("--host", required=False, default="127.0.0.1", metavar="HOST", help="address to listen on")
+    parser.add_argument("--port", required=False, type=int, default=7433, metavar="PORT", help="port to listen on")
+    parser.add_argument("--lease-timeout", required=False, type=float, default=300.0, metavar="SECONDS", help="time after which a handed out compair is offered again")
+    parser.add_argument("--rescan", required=False, type=float, default=5.0, metavar="SECONDS", help="interval for picking up new pictures, 0 disables")
+    parser.add_argument("--infer", required=False, type=float, default=0, metavar="CONFIDENCE", help="skip compairs whose result follows from others with at least this confidence, 0 disables")
+    parser.add_argument("--drop-unfit", required=False, type=int, default=0, metavar="COUNT", help="stop offering pictures marked unfit this many times without ever winning, 0 disables")
+    parser.add_argument("--dedupe", required=False, type=int, default=0, metavar="DISTANCE", help="group pictures whose difference hashes differ in at most this many of 64 bits, and only compare one picture per group, 0 disables")
+    args = parser.parse_args(argv)
+
+    if args.scorer != "winratio" and np is None:
+        print(f"ERROR: the {args.scorer} scorer requires numpy")
+        exit()
+
+    pics_base = os.path.abspath(args.pictures)
+    manifest = PictureManifest(pics_base, os.path.join(pics_base, ".isatara-manifest"))
+    pics = get_number_files_list(pics_base, manifest)
+    clusters = PictureClusters(pics_base, args.dedupe, os.path.join(pics_base, ".isatara-hashes")) if args.dedupe > 0 else None
+    record = Record(pics, os.path.abspath(args.record), args.compair_mode, args.scorer, args.record_format, args.fsync, args.infer, args.drop_unfit, clusters)
+    if clusters:
+        print(f"near-duplicates: {len(clusters.representative)} pictures in {len(clusters.members)} clusters")
+    server = RecordServer(record, args.lease_timeout, manifest=manifest, rescan_interval=args.rescan)
+    # a terminated server shuts down like an interrupted one
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"serving {args.record} on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        # the event loop is gone by now, the record still has to be written out
+        record.close()
+
+
+def main_convert(argv):
+    parser = argparse.ArgumentParser(prog="isatara.py convert", description="convert a comparison log between the text and the binary record format")
+    parser.add_argument("source", metavar="SOURCE", help="existing record file, in either format")
+    parser.add_argument("target", metavar="TARGET", help="new record file to write")
+    parser.add_argument("--format", required=False, choices=["text", "binary"], metavar="FORMAT", help="format of the target, defaults to the other one of the source: text, binary")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        print("ERROR: source record does not exist")
+        exit()
+    if os.path.exists(args.target):
+        print("ERROR: target record already exists")
+        exit()
+    record_format = args.format
+    if not record_format:
+        record_format = "text" if BinaryRecordFile.detect(args.source) else "binary"
+    convert_record_file(args.source, args.target, record_format)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "convert":
+        main_convert(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "rank":
+        main_rank(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        main_serve(sys.argv[2:])
+        return
     parser = argparse.ArgumentParser()
     parser.add_argument("--pictures", required=True, metavar="PATH", help="path to picture directory")
-    parser.add_argument("--record", required=True, metavar="RECORD", help="record file for comparison log")
+    parser.add_argument("--record", required=False, metavar="RECORD", help="record file for comparison log")
     parser.add_argument("--features", required=False, metavar="FEATURES", help="comma-separated list of comparison features")
-    parser.add_argument("--compair-mode", required=False, choices=["random", "refine", "explore", "smart"], default="random", metavar="COMPAIR_MODE", help="strategy for offering compairs, can be one of: random, refine, explore, smart")
+    parser.add_argument("--compair-mode", required=False, choices=["random", "refine", "explore", "smart", "sort"], default="random", metavar="COMPAIR_MODE", help="strategy for offering compairs, can be one of: random, refine, explore, smart, sort")
+    parser.add_argument("--scorer", required=False, choices=["winratio", "bradleyterry", "elo", "pagerank"], default="winratio", metavar="SCORER", help="scoring model for toplists, can be one of: winratio, bradleyterry, elo, pagerank")
+    parser.add_argument("--prefetch", required=False, type=int, default=4, metavar="PAIRS", help="number of upcoming compairs to decode ahead of time")
+    parser.add_argument("--preview-cache", required=False, metavar="PATH", help="preview store directory, defaults to .isatara-cache in the picture directory, used if it exists")
+    parser.add_argument("--preview-size", required=False, type=int, default=2560, metavar="PIXELS", help="longest side of stored previews")
+    parser.add_argument("--build-previews", action="store_true", help="fill the preview store using all cores, then exit")
+    parser.add_argument("--record-format", required=False, choices=["text", "binary"], default="text", metavar="FORMAT", help="format for a new record file, existing ones keep theirs: text, binary")
+    parser.add_argument("--fsync", required=False, choices=["batch", "never"], default="batch", metavar="FSYNC", help="whether the record gets fsynced after each written batch: batch, never")
+    parser.add_argument("--server", required=False, metavar="HOST:PORT", help="rate for a record server instead of a local record")
+    parser.add_argument("--rescan", required=False, type=float, default=5.0, metavar="SECONDS", help="interval for picking up new pictures, 0 disables")
+    parser.add_argument("--infer", required=False, type=float, default=0, metavar="CONFIDENCE", help="skip compairs whose result follows from others with at least this confidence, 0 disables")
+    parser.add_argument("--drop-unfit", required=False, type=int, default=0, metavar="COUNT", help="stop offering pictures marked unfit this many times without ever winning, 0 disables")
+    parser.add_argument("--dedupe", required=False, type=int, default=0, metavar="DISTANCE", help="group pictures whose difference hashes differ in at most this many of 64 bits, and only compare one picture per group, 0 disables")
+    parser.add_argument("--profile", required=False, metavar="PATH", help="time the hot paths from the start, and write the spans to this file on quit")
+    parser.add_argument("--profile-format", required=False, choices=["chrome", "json"], default="chrome", metavar="FORMAT", help="format of the profile file: chrome (trace event format), json (percentiles and spans)")
     args = parser.parse_args()
+    if not args.record and not args.server and not args.build_previews:
+        parser.error("the following arguments are required: --record")
+
+    if args.scorer != "winratio" and np is None:
+        print(f"ERROR: the {args.scorer} scorer requires numpy")
+        exit()
     
     pics_base = os.path.abspath(args.pictures)
-    pics = get_number_files_list(pics_base)
+    manifest = PictureManifest(pics_base, os.path.join(pics_base, ".isatara-manifest"))
+    pics = get_number_files_list(pics_base, manifest)
 
-    record_path = os.path.abspath(args.record)
+    preview_path = os.path.abspath(args.preview_cache) if args.preview_cache else os.path.join(pics_base, ".isatara-cache")
+    previews = PreviewStore(preview_path, args.preview_size)
+    if args.build_previews:
+        build_previews(previews, pics_base, pics)
+        exit()
+    if not os.path.isdir(preview_path):
+        previews = None
 
     comp_features = args.features.split(",") if args.features else []
     if not all(bool(re.match(r"^[a-zA-Z0-9]+$", feature)) or feature == "*" for feature in comp_features):
         print("ERROR: non alpha-numeric features are not supported")
         exit()
 
-    app = App(pics_base, pics, record_path, comp_features, args.compair_mode)
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        record = RecordClient(host, int(port))
+    else:
+        clusters = PictureClusters(pics_base, args.dedupe, os.path.join(pics_base, ".isatara-hashes")) if args.dedupe > 0 else None
+        record = Record(pics, os.path.abspath(args.record), args.compair_mode, args.scorer, args.record_format, args.fsync, args.infer, args.drop_unfit, clusters)
+        if clusters:
+            print(f"near-duplicates: {len(clusters.representative)} pictures in {len(clusters.members)} clusters")
+    app = App(pics_base, pics, record, comp_features, args.prefetch, previews, manifest, args.rescan, args.profile, args.profile_format)
     app.root.mainloop()
 
 